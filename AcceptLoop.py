@@ -0,0 +1,186 @@
+import errno
+import selectors
+import socket
+import struct
+import time
+from Metrics import NO_METRICS, SIZE_BUCKETS
+
+BACKLOG = 1024  # connections the kernel queues until they are accepted, capped by net.core.somaxconn
+MAX_PENDING = 1024  # connections waiting for their team name, more are left in the backlog
+READ_SIZE = 2048
+
+
+class PendingConnection:
+    """
+        an accepted connection whose team name isn't complete yet
+    """
+
+    __slots__ = ('sock', 'address', 'accepted_at', 'reader')
+
+    def __init__(self, sock, address, accepted_at, reader):
+
+        self.sock = sock
+        self.address = address
+        self.accepted_at = accepted_at
+        self.reader = reader
+
+
+class AcceptLoop:
+    """
+        accepts connections and reads the team names from a single selector loop, instead of a thread per client.
+        the listening socket is non-blocking and every time it is readable the connections queued in the backlog
+        are accepted until there are no more, so a burst of clients answering the same offer is drained at once.
+        the size of every batch is the depth of the backlog we observe
+    """
+
+    def __init__(self, server_socket, join, reader_factory, name_timeout, metrics=NO_METRICS,
+                 max_pending=MAX_PENDING):
+        """
+        :param server_socket: the listening tcp socket
+        :param join: callback invoked with (name, protocol, socket, address, accepted_at) once the team name of a
+                     connection is complete, the connection belongs to it from then on
+        :param reader_factory: callable returning an incremental reader of a team name, a TeamNameReader
+        :param name_timeout: seconds a client has to send it's team name
+        :param metrics: the Metrics the accepts and the batches are reported to
+        :param max_pending: connections waiting for their team name, more are left in the backlog
+        """
+
+        self.server_socket = server_socket
+        self.join = join
+        self.reader_factory = reader_factory
+        self.name_timeout = name_timeout
+        self.metrics = metrics
+        self.max_pending = max_pending
+
+        self.pending = {}  # socket to PendingConnection, in the order they were accepted
+        self.listening = False  # if the listening socket is registered in the selector
+        self.out_of_descriptors = None  # when accept last failed for lack of file descriptors
+        self.peak_batch = 0
+        self.read_buffer = bytearray(READ_SIZE)  # every read of the loop goes into it, the names are copied out
+
+    def run(self, finished, poll_interval):
+        """
+            accept connections and read their team names until finished returns True, then close the connections
+            that didn't send their name
+        :param finished: callable checked after every event and at least every poll_interval seconds
+        :param poll_interval: maximal seconds to block waiting for events
+        """
+
+        selector = selectors.DefaultSelector()
+        timeout = self.server_socket.gettimeout()
+        self.server_socket.setblocking(False)
+        try:
+            while not finished():
+                self.update_listening(selector, poll_interval)
+                for key, events in selector.select(poll_interval):
+                    if key.data is None:
+                        self.accept_batch(selector)
+                    else:
+                        self.read_name(selector, key.data)
+                self.expire(selector)
+        finally:
+            for pending in list(self.pending.values()):  # too late
+                self.fail(selector, pending)
+            selector.close()
+            try:
+                self.server_socket.settimeout(timeout)
+            except OSError:
+                pass
+
+    def update_listening(self, selector, poll_interval):
+        """
+            stop accepting while max_pending connections wait for their name, the kernel holds the others.
+            once we ran out of file descriptors accepting also stops, the listening socket stays readable and would
+            wake the loop for good - it resumes after poll_interval or once a pending connection is closed
+        """
+
+        out_of_descriptors = (self.out_of_descriptors is not None and
+                              time.time() - self.out_of_descriptors < poll_interval)
+        accepting = len(self.pending) < self.max_pending and not out_of_descriptors
+        if self.listening and not accepting:
+            selector.unregister(self.server_socket)
+            self.listening = False
+        elif not self.listening and accepting:
+            selector.register(self.server_socket, selectors.EVENT_READ, None)
+            self.listening = True
+
+    def accept_batch(self, selector):
+        """
+            accept the connections waiting in the backlog until there are no more
+        """
+
+        batch = 0
+        while len(self.pending) < self.max_pending:
+            try:
+                sock, address = self.server_socket.accept()
+            except BlockingIOError:
+                break
+            except socket.error as error:  # the connection was reset while queued, or we are out of file descriptors
+                if error.errno in (errno.EMFILE, errno.ENFILE):
+                    self.out_of_descriptors = time.time()
+                    self.metrics.increment('accept_backoffs_total')
+                break
+            sock.setblocking(False)
+            pending = PendingConnection(sock, address, time.time(), self.reader_factory())
+            selector.register(sock, selectors.EVENT_READ, pending)
+            self.pending[sock] = pending
+            batch += 1
+
+        if batch:
+            self.metrics.increment('accepts_total', batch)
+            self.metrics.observe('accept_batch_size', batch, SIZE_BUCKETS)
+            if batch > self.peak_batch:
+                self.peak_batch = batch
+                self.metrics.set_gauge('accept_backlog_peak', batch)
+
+    def read_name(self, selector, pending):
+        """
+            feed what a client sent to it's team name and hand the client over once the name is complete
+        """
+
+        try:
+            received = pending.sock.recv_into(self.read_buffer)
+        except BlockingIOError:
+            return
+        except socket.error:
+            received = 0
+        if not received:  # client closed the connection
+            self.fail(selector, pending)
+            return
+
+        try:
+            name = pending.reader.feed(self.read_buffer, received)
+        except (ValueError, struct.error):  # a malformed name must not end the loop accepting everyone else
+            self.fail(selector, pending)
+            return
+        if name is None:  # incomplete
+            return
+
+        selector.unregister(pending.sock)
+        del self.pending[pending.sock]
+        pending.sock.settimeout(None)
+        self.join(name, pending.reader.protocol, pending.sock, pending.address, pending.accepted_at)
+
+    def expire(self, selector):
+        """
+            give up on the clients that didn't send their name in time - the oldest connections come first
+        """
+
+        now = time.time()
+        while self.pending:
+            pending = next(iter(self.pending.values()))
+            if now - pending.accepted_at < self.name_timeout:
+                break
+            self.fail(selector, pending)
+
+    def fail(self, selector, pending):
+        """
+            close a connection whose team name is incorrect or didn't arrive in time
+        """
+
+        print("the group name received isn't correct" + pending.reader.buffer.decode(errors='replace'))
+        selector.unregister(pending.sock)
+        del self.pending[pending.sock]
+        pending.sock.close()
+        self.out_of_descriptors = None  # the connection freed a file descriptor
+        self.metrics.increment('failed_registrations_total')
@@ -0,0 +1,102 @@
+import socket
+import threading
+import time
+from Server import Server, Arena, INTERFACE, LOBBY_POLL_INTERVAL
+
+MAX_ARENAS = 4
+
+
+class ArenaServer(Server):
+    """
+        runs up to max_arenas independent games at once on a single listening port.
+        one arena at a time is filling - new teams join it while the other arenas are playing,
+        and once it's lobby closes the next arena opens as soon as there is room for it. teams arriving while
+        every arena is playing are queued, and join the next arena when it opens
+    """
+
+    def __init__(self, name, lobby_policy=None, max_arenas=MAX_ARENAS, interface=INTERFACE):
+
+        super().__init__(name, lobby_policy, interface)
+        self.max_arenas = max_arenas
+        self.playing = []  # arenas currently in game mode
+        self.arenas_changed = threading.Condition()
+
+    def start_server(self):
+        """
+            listen on the tcp port for good, broadcast offers while an arena is filling and run the lobbies
+        """
+        print("Server started, listening on {IP} address".format(IP=self.server_ip))
+
+        self.server_socket = self.create_server_socket()
+
+        threading.Thread(target=self.broadcast_offer, args=(), daemon=True).start()
+        threading.Thread(target=self.run_lobbies, args=(), daemon=True).start()
+        self.accept_tcp()
+
+    def run_lobbies(self):
+        """
+            open a new arena whenever there is room for it, and start it's game once it's lobby closes
+        """
+        while True:
+            with self.arenas_changed:
+                while len(self.playing) >= self.max_arenas:
+                    self.arenas_changed.wait()
+                arena = Arena(self, self.lobby_policy, groups=self.groups)
+                with self.arena_lock:
+                    self.arena = arena
+                    self.join_queued()
+                self.arenas_changed.notify_all()
+
+            start = time.time()
+            while not arena.update_lobby():
+                arena.lobby_closed.wait(LOBBY_POLL_INTERVAL)
+            self.metrics.observe('lobby_seconds', time.time() - start)
+
+            with self.arenas_changed:
+                with self.arena_lock:
+                    self.arena = None
+                self.playing.append(arena)
+                self.metrics.set_gauge('playing_arenas', len(self.playing))
+                self.arenas_changed.notify_all()
+
+            threading.Thread(target=self.play, args=(arena,)).start()
+
+    def play(self, arena):
+        """
+            play the game of an arena whose lobby closed, then make room for a new arena
+        :param arena: the arena to play
+        """
+        try:
+            if len(arena.players()) == 0:
+                return
+            print("Entering game mode with {} teams".format(len(arena.players())))
+            arena.send_welcome()
+            self.play_round(arena)
+        finally:
+            with self.arenas_changed:
+                self.playing.remove(arena)
+                self.metrics.set_gauge('playing_arenas', len(self.playing))
+                self.arenas_changed.notify_all()
+
+    def broadcast_offer(self):
+        """
+            broadcast udp offers announcing the load of the arena that is filling, see Arena.offer_interval
+        """
+        broadcast_ip = '<broadcast>'
+        try:
+            sock = socket.socket(socket.AF_INET,  # Internet
+                                 socket.SOCK_DGRAM)  # UDP
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        except socket.error:
+            return
+
+        while True:
+            with self.arenas_changed:
+                while self.arena is None:
+                    self.arenas_changed.wait()
+                arena = self.arena
+            interval = arena.offer_interval()
+            if interval is not None:
+                sock.sendto(self.offer_message(arena), (broadcast_ip, self.udp_port))
+                self.metrics.increment('offers_sent_total')
+            time.sleep(interval if interval is not None else LOBBY_POLL_INTERVAL)
@@ -0,0 +1,297 @@
+import asyncio
+import socket
+import time
+from Server import Server, Arena, TeamNameReader, INTERFACE, TIMEOUT, BUFFER_SIZE, LOBBY_POLL_INTERVAL
+from Protocol import result_text
+from FanOut import FANOUT_TIMEOUT
+
+
+class AsyncServer(Server):
+    """
+        asyncio variant of the server - the lobby, the registration of the teams and the game all run as
+        coroutines on a single event loop instead of a thread per client.
+        the connection slot of every player holds the (reader, writer) stream pair of the client
+    """
+
+    def __init__(self, name, lobby_policy=None, interface=INTERFACE):
+
+        super().__init__(name, lobby_policy, interface)
+        self.registrations = []
+        self.tcp_server = None  # the listening asyncio server, kept open for all the rounds
+
+    def start_server(self):
+        """
+            run the lobby and game rounds forever on a single event loop
+        """
+        print("Server started, listening on {IP} address".format(IP=self.server_ip))
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self.serve_forever())
+        finally:
+            loop.close()
+
+    async def serve_forever(self):
+        """
+            alternate between waiting for clients and game mode, like Server.start_server
+        """
+        while True:
+            await self.waiting_for_clients()
+            print("Entering game mode")
+            # the profiler covers everything the loop runs during the game
+            session = self.profiler.start() if self.profiler else None
+            try:
+                await self.game_mode()
+            finally:
+                if session:
+                    self.profiler.stop(session)
+            print("Game over, sending out offer requests...")
+
+    async def waiting_for_clients(self):
+        """
+            simultaneously send udp broadcasts offers and accept tcp connections until the lobby policy starts the game
+        """
+        # the event is created inside the running loop, closing the lobby wakes every coroutine waiting for it
+        self.arena = Arena(self, self.lobby_policy, asyncio.Event(), self.groups)
+        self.join_queued()  # the clients that arrived during the previous game
+        start = time.time()
+
+        await asyncio.gather(self.broadcast_offer(), self.accept_tcp())
+        self.metrics.observe('lobby_seconds', time.time() - start)
+
+    async def broadcast_offer(self):
+        """
+            broadcast udp offers announcing the load of the lobby until it closes, see Arena.offer_interval
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            transport, protocol = await loop.create_datagram_endpoint(asyncio.DatagramProtocol,
+                                                                      family=socket.AF_INET,
+                                                                      allow_broadcast=True)
+        except OSError:
+            return
+
+        arena = self.arena
+        try:
+            while not arena.lobby_closed.is_set():
+                interval = arena.offer_interval()
+                if interval is not None:
+                    transport.sendto(self.offer_message(arena), ('<broadcast>', self.udp_port))
+                    self.metrics.increment('offers_sent_total')
+                try:
+                    await asyncio.wait_for(arena.lobby_closed.wait(),
+                                           interval if interval is not None else LOBBY_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            transport.close()
+
+    async def accept_tcp(self):
+        """
+            accept tcp connections, registering every client as a coroutine, until the lobby closes
+            then send welcoming message to each group. the listening server stays open, clients arriving during the
+            game are queued for the next lobby
+        """
+        if self.tcp_server is None:
+            try:
+                # asyncio accepts until the backlog is empty every time the listening socket is readable
+                self.tcp_server = await asyncio.start_server(self.on_connection, self.server_ip, self.port_number,
+                                                             backlog=self.backlog, reuse_address=True)
+            except OSError:
+                self.arena.lobby_closed.set()  # nothing to wait for, stop broadcasting
+                raise
+
+        # registrations close the lobby themselves when they fill it, time based rules are checked here
+        while not self.arena.update_lobby():
+            try:
+                await asyncio.wait_for(self.arena.lobby_closed.wait(),
+                                       min(self.arena.lobby_time_left(), LOBBY_POLL_INTERVAL))
+            except asyncio.TimeoutError:
+                pass
+
+        # clients that didn't send their name yet go on registering, for the next lobby
+        self.registrations = [registration for registration in self.registrations if not registration.done()]
+
+        for player in self.arena.players():
+            await self.discard_lobby_bytes(player)
+        rosters = self.arena.rosters()
+        start = time.time()
+        delivered = await asyncio.gather(*(self.send(player, self.arena.encode_message(player, 'welcome', rosters))
+                                           for player in self.arena.players()))
+        self.metrics.observe('welcome_fanout_seconds', time.time() - start)
+        self.metrics.increment('fanout_dropped_total', delivered.count(False))
+
+    async def discard_lobby_bytes(self, player):
+        """
+            read and discard what a client sent since it registered, keys count from the welcome on.
+            a read is given a single step of the loop, it completes then only if the bytes are already buffered
+        :param player: the Player, it's connection is the (reader, writer) pair
+        """
+        reader, writer = player.connection
+        while True:
+            read = asyncio.ensure_future(reader.read(BUFFER_SIZE))
+            await asyncio.sleep(0)
+            if not read.done():  # nothing left to read
+                read.cancel()
+                return
+            try:
+                data = read.result()
+            except OSError:
+                return
+            if not data:  # client closed the connection, the game finds out
+                return
+            self.arena.drain(player, len(data), time.time())
+
+    def connection_closed(self, connection):
+        """
+            the stream reader sees the end of the stream once the client closed the connection and what it sent
+            while it waited was read
+        :param connection: the (reader, writer) pair of the client
+        :rtype: bool
+        """
+        reader, writer = connection
+        return reader.at_eof() or writer.transport.is_closing()
+
+    def close_connection(self, connection):
+        reader, writer = connection
+        writer.close()
+
+    def on_connection(self, reader, writer):
+        """
+            callback of the listening server - start the registration of a new client
+        """
+        self.metrics.increment('accepts_total')
+        registration = asyncio.ensure_future(self.connect_to_client(reader, writer))
+        self.registrations.append(registration)
+
+    async def connect_to_client(self, reader, writer):
+        """
+            wait for the client to send it's team name and assign it to a group, or queue it for the next lobby
+        :param reader: stream reader of the client connection
+        :param writer: stream writer of the client connection
+        """
+        client_address = writer.get_extra_info('peername')
+        start = time.time()
+        name_reader = TeamNameReader()
+        try:
+            group_name = await asyncio.wait_for(self.read_team_name(reader, name_reader), self.lobby_policy.window)
+        except (asyncio.TimeoutError, OSError, ValueError):
+            group_name = None
+
+        if group_name is None:
+            # the name received isn't correct
+            print("the group name received isn't correct" + name_reader.buffer.decode(errors='replace'))
+            writer.close()
+            self.metrics.increment('failed_registrations_total')
+            return
+
+        self.join_lobby(group_name, name_reader.protocol, (reader, writer), client_address, start)
+
+    async def read_team_name(self, reader, name_reader):
+        """
+            read from the client until the '\n' terminated team name or the register frame is complete
+        :param reader: stream reader of the client connection
+        :param name_reader: incremental reader the received bytes are fed to
+        :return: the team name, None if the client closed the connection before sending it
+        """
+        while True:
+            data = await reader.read(BUFFER_SIZE)
+            if not data:  # client closed the connection
+                return None
+            group_name = name_reader.feed(data)
+            if group_name is not None:
+                return group_name
+
+    async def game_mode(self):
+        """
+            count the keys of every player until the game is over, then print and send the end of the game message
+        """
+        players = self.arena.players()
+        if len(players) == 0:
+            print("no players connected")
+            return
+        self.arena.start_game()
+
+        # a single deadline for the whole game, the counters are updated in place so cancelling keeps them
+        receivers = [asyncio.ensure_future(self.receive_keys(player)) for player in players]
+        publisher = asyncio.ensure_future(self.publish_scores())
+        done, pending = await asyncio.wait(receivers, timeout=TIMEOUT)
+        for receiver in pending:
+            receiver.cancel()
+        publisher.cancel()
+        self.arena.report_ingestion(time.time() - self.arena.begin)
+
+        result = self.arena.result()
+        print(result_text(*result))
+
+        start = time.time()
+        delivered = await asyncio.gather(*(self.send(player, self.arena.encode_message(player, 'results', *result),
+                                                     close=True) for player in players))
+        self.metrics.observe('result_fanout_seconds', time.time() - start)
+        self.metrics.increment('fanout_dropped_total', delivered.count(False))
+
+    async def receive_keys(self, player):
+        """
+            count the keys sent by the client until it closes the connection or the coroutine is cancelled
+        :param player: the Player, it's connection is the (reader, writer) pair
+        """
+        reader, writer = player.connection
+        while True:
+            try:
+                data = await reader.read(BUFFER_SIZE)
+            except OSError:
+                return
+            if not data:  # client closed the connection
+                return
+            if not self.arena.ingest(player, data):  # the client broke the binary protocol
+                return
+
+    async def publish_scores(self):
+        """
+            send live score snapshots to the players until the coroutine is cancelled.
+            a client whose previous snapshot is still buffered skips the next one
+        """
+        while True:
+            await asyncio.sleep(self.arena.scoreboard.interval)
+            for player, message in self.arena.score_messages():
+                reader, writer = player.connection
+                if not writer.transport.is_closing() and writer.transport.get_write_buffer_size() == 0:
+                    writer.write(message)
+
+    async def send(self, player, message, close=False, timeout=FANOUT_TIMEOUT):
+        """
+            send a message to a player, dropping the message if the client doesn't read it in time. the connection
+            is only closed if close is set, a client that is slow to read the welcome still plays the game
+        :param player: the Player, it's connection is the (reader, writer) pair
+        :param message: encoded message
+        :param close: close the connection after sending - the sending side is shut down first and whatever the
+                      client still sends is read until it closes too, so the message isn't lost to a reset
+        :param timeout: seconds the client has to read the message
+        :return: if the message was delivered
+        :rtype: bool
+        """
+        reader, writer = player.connection
+        deadline = time.time() + timeout
+        try:
+            writer.write(message)
+            await asyncio.wait_for(writer.drain(), timeout)
+        except (asyncio.TimeoutError, OSError):
+            if close:
+                writer.close()
+            return False
+
+        if close:
+            try:
+                writer.write_eof()
+                await asyncio.wait_for(self.drain(reader), max(deadline - time.time(), 0))
+            except (asyncio.TimeoutError, OSError):
+                pass
+            writer.close()
+        return True
+
+    async def drain(self, reader):
+        """
+            read and discard what the client sends until it closes the connection
+        """
+        while await reader.read(BUFFER_SIZE):
+            pass
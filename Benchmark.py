@@ -0,0 +1,339 @@
+import os
+import re
+import sys
+import heapq
+import socket
+import resource
+import selectors
+import subprocess
+import time
+from scapy.arch import get_if_addr
+from Client import SyntheticKeyboard, BUFFER_SIZE, KEY_RATE
+from Server import TIMEOUT as GAME_TIME
+
+BENCHMARK_INTERFACE = 'lo'
+SERVER_PORT = 2049
+SERVER_STARTUP = 1  # seconds to let the server start listening
+SWARM_TIMEOUT = 60  # maximal seconds a benchmark round may take
+WELCOME_END = "Start pressing keys on your keyboard as fast as you can!!"
+# end of the game messages, as built by Protocol.result_text
+SUMS_PATTERN = re.compile(r"Group (\d+) typed in (\d+) characters\.")
+DRAW_PATTERN = re.compile(r"typed in (\d+) characters\. It's a draw! ")
+GROUP_PATTERN = re.compile(r"\nGroup (\d+):\n")  # headers of the groups in the welcoming message
+
+# states of a bot
+CONNECTING = 0
+WAITING_FOR_WELCOME = 1
+PLAYING = 2
+DONE = 3
+
+
+class Bot:
+    """
+        a simulated team driven by the swarm's event loop
+    """
+
+    def __init__(self, name, keyboard):
+
+        self.name = name
+        self.keyboard = keyboard
+        self.sock = None
+        self.state = CONNECTING
+        self.connect_start = None
+        self.registration_latency = None  # seconds from connecting until the team name was sent
+        self.received = bytearray()
+        self.welcome = None
+        self.group = None
+        self.groups = None  # number of groups in the game
+        self.sent = 0  # key bytes the server accepted from us
+        self.end_message = None
+        self.welcome_time = None
+        self.end_time = None
+
+    def parse_welcome(self):
+        """
+            find the group of the bot in the roster of the welcoming message
+        """
+        self.welcome = self.received.decode(errors='replace')
+        position = self.welcome.find("\n" + self.name + "\n")
+        headers = list(GROUP_PATTERN.finditer(self.welcome))
+        self.groups = len(headers)
+        self.group = max(int(header.group(1)) for header in headers if header.start() <= position)
+
+
+class BotSwarm:
+    """
+        runs thousands of bots from a single selector loop against a server - every bot registers,
+        types synthetic key-presses during the game and reads the end of the game message
+    """
+
+    def __init__(self, address, bots, rate=KEY_RATE, burstiness=1, key_count=None):
+        """
+        :param address: (ip, port) of the server
+        :param bots: number of simulated teams
+        :param rate: average key-presses per second of every bot
+        :param burstiness: key-presses a bot types at once
+        :param key_count: key-presses every bot types in the game, None for no limit
+        """
+
+        self.address = address
+        self.bots = [Bot("bot{:05d}".format(i), SyntheticKeyboard(rate, burstiness, key_count, seed=i))
+                     for i in range(bots)]
+        self.selector = selectors.DefaultSelector()
+        self.bursts = []  # heap of (due time, bot index)
+        self.first_connect = None
+        self.last_registration = None
+        # every read of the swarm goes into this buffer, the messages are copied out of it
+        self.receive_buffer = bytearray(BUFFER_SIZE)
+        self.receive_view = memoryview(self.receive_buffer)
+
+    def run(self, timeout=SWARM_TIMEOUT):
+        """
+            connect all the bots and play until every bot finished the game or timeout passed
+        """
+        deadline = time.time() + timeout
+        self.first_connect = time.time()
+        for bot in self.bots:
+            self.connect(bot)
+
+        while any(bot.state != DONE for bot in self.bots):
+            now = time.time()
+            if now >= deadline:
+                break
+            wait = deadline - now
+            if self.bursts:
+                wait = min(wait, max(self.bursts[0][0] - now, 0))
+
+            for key, events in self.selector.select(wait):
+                bot = key.data
+                if bot.state == CONNECTING:
+                    self.register(bot)
+                else:
+                    self.receive(bot)
+
+            self.type_bursts()
+
+        for bot in self.bots:
+            if bot.state != DONE:
+                self.finish(bot)
+        self.selector.close()
+
+    def connect(self, bot):
+        """
+            start a non blocking connection to the server
+        """
+        bot.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        bot.sock.setblocking(False)
+        bot.connect_start = time.time()
+        bot.sock.connect_ex(self.address)
+        self.selector.register(bot.sock, selectors.EVENT_WRITE, bot)
+
+    def register(self, bot):
+        """
+            the connection is established or failed - send the team name
+        """
+        if bot.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) != 0:
+            self.finish(bot)
+            return
+        try:
+            bot.sock.send((bot.name + "\n").encode())
+        except socket.error:
+            self.finish(bot)
+            return
+        bot.registration_latency = time.time() - bot.connect_start
+        self.last_registration = time.time()
+        bot.state = WAITING_FOR_WELCOME
+        self.selector.modify(bot.sock, selectors.EVENT_READ, bot)
+
+    def receive(self, bot):
+        """
+            read the welcoming message, then the end of the game message until the server closes the connection
+        """
+        try:
+            received = bot.sock.recv_into(self.receive_buffer)
+        except BlockingIOError:
+            return
+        except socket.error:
+            received = 0
+        if not received:  # server closed the connection
+            if bot.state == PLAYING:
+                bot.end_message = bot.received.decode(errors='replace')
+                bot.end_time = time.time()
+            self.finish(bot)
+            return
+
+        bot.received.extend(self.receive_view[:received])
+        if bot.state == WAITING_FOR_WELCOME and WELCOME_END.encode() in bot.received:
+            bot.parse_welcome()
+            bot.received = bytearray()
+            bot.welcome_time = time.time()
+            bot.state = PLAYING
+            bot.keyboard.start()
+            self.schedule(bot)
+
+    def schedule(self, bot):
+        """
+            queue the next burst of key-presses of a bot
+        """
+        delay = bot.keyboard.time_until_keys()
+        if delay is not None:
+            heapq.heappush(self.bursts, (time.time() + delay, id(bot), bot))
+
+    def type_bursts(self):
+        """
+            send every burst that is due. a bot stops typing GAME_TIME seconds after it's welcome, the server
+            doesn't count later keys so they would show up as lost
+        """
+        now = time.time()
+        while self.bursts and self.bursts[0][0] <= now:
+            due, key, bot = heapq.heappop(self.bursts)
+            if bot.state != PLAYING or now >= bot.welcome_time + GAME_TIME:
+                continue
+            keys = bot.keyboard.read()
+            try:
+                bot.sent += bot.sock.send(keys)
+            except BlockingIOError:  # the server doesn't keep up, the keys are dropped on our side
+                pass
+            except socket.error:
+                continue
+            self.schedule(bot)
+
+    def finish(self, bot):
+        """
+            close the connection of a bot that finished or failed
+        """
+        bot.state = DONE
+        try:
+            self.selector.unregister(bot.sock)
+        except (KeyError, ValueError):
+            pass
+        bot.sock.close()
+
+
+def percentile(values, fraction):
+    """
+    :param values: sorted values
+    :param fraction: between 0 and 1
+    """
+    if not values:
+        return 0
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def process_stat(pid):
+    """
+    :return: the fields of /proc/pid/stat following the command name, the parent pid is the second
+    :rtype: list
+    """
+    with open("/proc/{}/stat".format(pid)) as stat:
+        return stat.read().rsplit(")", 1)[1].split()
+
+
+def process_tree(pid):
+    """
+    :return: the pid and the pids of all it's descendants, e.g. the workers of a sharded server
+    :rtype: list
+    """
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                parents[int(entry)] = int(process_stat(entry)[1])
+            except (OSError, IndexError):  # the process exited meanwhile
+                pass
+
+    tree = [pid]
+    for parent in tree:
+        tree.extend(child for child, child_parent in parents.items() if child_parent == parent)
+    return tree
+
+
+def process_usage(pid):
+    """
+        cpu seconds (user + system) and peak resident memory in MB of a process and it's descendants, read from
+        /proc. the peak memory is the sum of the peaks of the processes
+    """
+    cpu = 0
+    peak_rss = 0
+    for process in process_tree(pid):
+        try:
+            fields = process_stat(process)
+            with open("/proc/{}/status".format(process)) as status:
+                lines = status.readlines()
+        except OSError:  # the process exited meanwhile
+            continue
+        cpu += (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        for line in lines:
+            if line.startswith("VmHWM:"):
+                peak_rss += int(line.split()[1]) / 1024
+    return cpu, peak_rss
+
+
+def report(swarm, server_cpu, server_rss, wall):
+    """
+        summarize a benchmark round
+    """
+    bots = swarm.bots
+    registered = [bot for bot in bots if bot.registration_latency is not None]
+    latencies = sorted(bot.registration_latency for bot in registered)
+    registration_time = (swarm.last_registration or swarm.first_connect) - swarm.first_connect
+
+    # compare what every group sent with what the server counted, per game (games are told apart by roster)
+    games = {}
+    for bot in bots:
+        if bot.welcome is None:
+            continue
+        game = games.setdefault(bot.welcome, {'sent': [0] * bot.groups, 'counted': None, 'start': bot.welcome_time,
+                                              'end': bot.end_time})
+        game['sent'][bot.group - 1] += bot.sent
+        if bot.end_message and game['counted'] is None:
+            draw = DRAW_PATTERN.search(bot.end_message)
+            if draw:
+                game['counted'] = [int(draw.group(1))] * bot.groups
+            else:
+                game['counted'] = [int(group_sum) for number, group_sum in SUMS_PATTERN.findall(bot.end_message)]
+            game['end'] = bot.end_time
+
+    sent = sum(sum(game['sent']) for game in games.values())
+    counted = sum(sum(game['counted']) for game in games.values() if game['counted'])
+    miscounted = sum(abs(game['sent'][i] - game['counted'][i]) if game['counted'] else sum(game['sent'])
+                     for game in games.values() for i in range(len(game['sent'])))
+    game_time = sum(game['end'] - game['start'] for game in games.values() if game['counted'] and game['end'])
+
+    print("bots: {} registered: {} played: {} games: {}".format(
+        len(bots), len(registered), sum(1 for bot in bots if bot.end_message), len(games)))
+    print("registrations per second: {:.1f}".format(len(registered) / registration_time if registration_time else 0))
+    print("registration latency p50: {:.2f} ms p99: {:.2f} ms".format(percentile(latencies, 0.5) * 1000,
+                                                                      percentile(latencies, 0.99) * 1000))
+    print("keys sent: {} counted by the server: {} lost or miscounted: {}".format(sent, counted, miscounted))
+    print("keys per second ingested: {:.1f}".format(counted / game_time if game_time else 0))
+    print("server cpu: {:.2f} s ({:.1f}% of {:.1f} s) peak rss: {:.1f} MB".format(
+        server_cpu, 100 * server_cpu / wall, wall, server_rss))
+
+
+def run_benchmark(bots, rate=KEY_RATE, burstiness=1, key_count=None, interface=BENCHMARK_INTERFACE,
+                  port=SERVER_PORT, server_args=()):
+    """
+        start a local server, run a swarm of bots against it over the interface and report the results
+    :param bots: number of simulated teams
+    :param server_args: extra command line arguments of runServer.py, e.g. ['--async']
+    """
+    # every bot holds a socket
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < bots + 64:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, bots + 64) if hard > 0 else bots + 64, hard))
+
+    run_server = os.path.join(os.path.dirname(os.path.abspath(__file__)), "runServer.py")
+    command = [sys.executable, run_server, '--interface', interface, '--port', str(port),
+               '--max-players', str(bots)] + list(server_args)
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    try:
+        time.sleep(SERVER_STARTUP)
+        start = time.time()
+        swarm = BotSwarm((get_if_addr(interface), port), bots, rate, burstiness, key_count)
+        swarm.run()
+        server_cpu, server_rss = process_usage(server.pid)
+        report(swarm, server_cpu, server_rss, time.time() - start + SERVER_STARTUP)
+    finally:
+        server.terminate()
+        server.wait()
@@ -1,22 +1,251 @@
+import os
+import sys
+import tty
+import random
 import socket
-import struct
+import termios
 import time
-import multiprocessing
-import getch
+import selectors
 from scapy.arch import get_if_addr
+from Discovery import Discovery, OFFER_PORT
+from Protocol import FrameReader, WELCOME, RESULTS, SCORE, MAX_SERVER_PAYLOAD, pack_register, pack_keys, \
+    unpack_welcome, unpack_results, unpack_score, welcome_text, result_text, score_text
 
+INTERFACE = 'eth1'  # default network interface the client listens on for offers
 TIMEOUT = 15
 BUFFER_SIZE = 2048
-UDP_PACKET_SIZE = 7
+BATCH_SIZE = 64  # bytes of buffered key-presses that are sent right away
+BATCH_INTERVAL = 0.005  # maximal seconds a key-press waits in the buffer before it is sent
+# socket policies for sending key-presses
+NODELAY_POLICY = 'nodelay'  # disable Nagle's algorithm, every batch is sent in it's own segment right away
+CORK_POLICY = 'cork'  # cork the socket, the kernel only sends full segments or what is waiting when we flush
+KEY_RATE = 20  # default key-presses per second of a bot
+MAX_KEYS_FRAME = 0xffff  # most key-presses a single key frame of the binary protocol can count
+
+
+class KeyBatcher:
+    """
+        buffers key-presses and sends them in batches - once batch_size bytes are waiting or once the oldest waiting
+        key-press is batch_interval seconds old. the server only counts bytes, so the total stays the same while
+        far fewer segments are sent. with the binary protocol a batch is sent as a single key frame counting it's
+        key-presses
+    """
+
+    def __init__(self, sock, batch_size=BATCH_SIZE, batch_interval=BATCH_INTERVAL, socket_policy=None, binary=False):
+        """
+        :param sock: connected server TCP socket
+        :param batch_size: bytes of buffered key-presses that are sent right away
+        :param batch_interval: maximal seconds a key-press waits in the buffer
+        :param socket_policy: None, NODELAY_POLICY or CORK_POLICY
+        :param binary: send key frames of the binary protocol instead of the key-presses themselves
+        """
+
+        self.sock = sock
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.socket_policy = socket_policy
+        self.binary = binary
+
+        self.buffer = bytearray()
+        self.first_key_time = None  # when the oldest waiting key-press was buffered
+
+        if socket_policy == NODELAY_POLICY:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        elif socket_policy == CORK_POLICY:
+            # without TCP_NODELAY, Nagle's algorithm could still hold the data back when uncorking
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 1)
+
+    def add(self, keys):
+        """
+            buffer key-presses, sending the batch if it is full.
+            This function throws exception socket.error
+        :param keys: the key-presses
+        :type keys: bytes
+        """
+
+        if not self.buffer:
+            self.first_key_time = time.time()
+        self.buffer.extend(keys)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def time_until_flush(self):
+        """
+        :return: seconds until the waiting key-presses are due, None if no key-press is waiting
+        :rtype: float
+        """
+
+        if not self.buffer:
+            return None
+        return self.first_key_time + self.batch_interval - time.time()
+
+    def is_due(self):
+        """
+        :return: if the oldest waiting key-press waited batch_interval seconds
+        :rtype: bool
+        """
+
+        return bool(self.buffer) and time.time() - self.first_key_time >= self.batch_interval
+
+    def flush(self):
+        """
+            send the waiting key-presses.
+            This function throws exception socket.error
+        """
+
+        if not self.buffer:
+            return
+        keys = bytes(self.buffer)
+        self.buffer.clear()
+        self.first_key_time = None
+
+        if self.binary:
+            self.sock.sendall(b''.join(pack_keys(min(len(keys) - i, MAX_KEYS_FRAME))
+                                       for i in range(0, len(keys), MAX_KEYS_FRAME)))
+        else:
+            self.sock.sendall(keys)
+        if self.socket_policy == CORK_POLICY:  # uncork to push the partial segment out
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 0)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 1)
+
+
+class Keyboard:
+    """
+        stdin as a stream of key-presses. a terminal is put in cbreak mode while playing,
+        so every key-press can be read as soon as it is typed, without echo and without waiting for enter
+    """
+
+    def __init__(self, stream=sys.stdin):
+
+        self.fd = stream.fileno()
+        self.terminal_settings = None
+
+    def __enter__(self):
+        if os.isatty(self.fd):
+            self.terminal_settings = termios.tcgetattr(self.fd)
+            tty.setcbreak(self.fd)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.terminal_settings:
+            termios.tcsetattr(self.fd, termios.TCSADRAIN, self.terminal_settings)
+            self.terminal_settings = None
+
+    def fileno(self):
+        return self.fd
+
+    def time_until_keys(self):
+        """
+        :return: None - key-presses are typed by a human, wait for stdin to be readable
+        """
+        return None
+
+    def read(self):
+        """
+        :return: the key-presses typed since the last read, empty at end of input
+        :rtype: bytes
+        """
+        return os.read(self.fd, BUFFER_SIZE)
+
+
+class SyntheticKeyboard:
+    """
+        headless stand-in for the keyboard used by bots. key-presses come in bursts of burstiness keys,
+        the bursts start at random (poisson) times so that on average rate keys are typed per second
+    """
+
+    def __init__(self, rate=KEY_RATE, burstiness=1, key_count=None, seed=None):
+        """
+        :param rate: average key-presses per second, 0 for a bot that never types
+        :param burstiness: key-presses typed at once in every burst
+        :param key_count: key-presses typed in a game before stopping, None for no limit
+        :param seed: seed of the random schedule, for reproducible runs
+        """
+
+        self.rate = rate
+        self.burstiness = burstiness
+        self.key_count = key_count
+        self.random = random.Random(seed)
+
+        self.sent = 0  # key-presses typed in the current game
+        self.next_burst = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def fileno(self):
+        """
+        :return: None - there is nothing to wait for, the key-presses are due according to time_until_keys
+        """
+        return None
+
+    def start(self):
+        """
+            start typing the key-presses of a new game
+        """
+        self.sent = 0
+        self.schedule()
+
+    def schedule(self):
+        """
+            pick the time of the next burst, bursts are (rate / burstiness) per second on average. None if the rate is 0
+        """
+        if self.rate <= 0:
+            self.next_burst = None
+            return
+        self.next_burst = time.time() + self.random.expovariate(self.rate / self.burstiness)
+
+    def time_until_keys(self):
+        """
+        :return: seconds until the next burst is due, None once key_count keys were typed or if it never types
+        :rtype: float
+        """
+        if self.next_burst is None or (self.key_count is not None and self.sent >= self.key_count):
+            return None
+        return self.next_burst - time.time()
+
+    def read(self):
+        """
+        :return: the key-presses of the burst that is due
+        :rtype: bytes
+        """
+        size = self.burstiness
+        if self.key_count is not None:
+            size = min(size, self.key_count - self.sent)
+        self.sent += size
+        self.schedule()
+        return b'k' * size
 
 
 class Client:
 
-    def __init__(self, name):
+    def __init__(self, name, socket_policy=None, keyboard=None, interface=INTERFACE, binary=False,
+                 discovery_policy=None):
+        """
+        :param name: the team name
+        :param socket_policy: None, NODELAY_POLICY or CORK_POLICY for sending key-presses
+        :param keyboard: source of key-presses, SyntheticKeyboard for a headless bot. stdin by default
+        :param interface: network interface to listen on for offers
+        :param binary: speak the binary protocol - register with a frame, send key counts and render the messages
+        :param discovery_policy: DiscoveryPolicy choosing between the servers offering a game, the first one by default
+        """
 
         self.name = name
-        self.client_ip = get_if_addr('eth1')
-        self.udp_port = 13117
+        self.socket_policy = socket_policy
+        self.binary = binary
+        self.frames = None  # reader of the frames sent by the server, binary protocol only
+        # every read from the server goes into this buffer, the messages are copied out of it
+        self.receive_buffer = bytearray(BUFFER_SIZE)
+        self.receive_view = memoryview(self.receive_buffer)
+        self.keyboard = keyboard
+        self.client_ip = get_if_addr(interface)
+        self.udp_port = OFFER_PORT
+        self.discovery = Discovery(self.client_ip, self.udp_port, discovery_policy)  # open for all the rounds
         self.server_port = None
         self.server_ip = None
 
@@ -30,59 +259,40 @@ class Client:
 
         print("Client started, listening for offer requests...")
 
-        while True:
-            # look for server over udp
-            found_server = self.looking_for_server()
+        try:
+            while True:
+                # look for server over udp
+                found_server = self.looking_for_server()
 
-            if found_server:
-                # connect via TCP connection
-                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as tcp_socket:
-                    connected = self.connecting_to_server(tcp_socket)
+                if found_server:
+                    # connect via TCP connection
+                    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as tcp_socket:
+                        connected = self.connecting_to_server(tcp_socket)
 
-                    if connected:  # successfully connected to server
-                        self.game_mode(tcp_socket)
+                        if connected:  # successfully connected to server
+                            self.game_mode(tcp_socket)
+        finally:
+            self.discovery.close()
 
     def looking_for_server(self):
         """
-        Listen for available servers over UDP
+        Listen for available servers over UDP and choose one of them
         :return: If successfully contacted a server
         :rtype: bool
         """
 
         try:
+            offer = self.discovery.discover()
+        except socket.error:
+            print("Failed to listen for offers")
+            return False
 
-            udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            udp_socket.bind((self.client_ip, self.udp_port))
-
-            # receive UDP broadcast from server
-            # listen for offer invitations
-            msglen = UDP_PACKET_SIZE  # UDP_PACKET_SIZE bytes of data according to agreed format
-            packet = self.recvall_udp(udp_socket, msglen)
-
-            if packet:  # successfully received udp offer
-                message, self.server_ip = packet
-
-                magic_cookie, message_type, self.server_port = struct.unpack("IbH", message)
-                if magic_cookie != 0xfeedbeef:  # magicCookie
-                    print("the message is rejected not a magic cookie")
-                    return False
-
-                if message_type != 0x2:  # offer message
-                    print("only 0x2 offer types are supported")
-                    return False
-
-                # receive offer
-                print("Recieved offer from {IP}, attempting to connect...".format(IP=self.server_ip))
+        self.server_ip, self.server_port = offer.address()
+        print("Recieved offer from {IP}, attempting to connect...".format(IP=self.server_ip))
 
-                # wait for TIMEOUT seconds from connection to server to receive "game welcome" message
-                self.beginTimer = time.time()
-                return True
-            else:
-                return False
-
-        except struct.error:
-            print("Failed to unpack message. Wrong header format given")
-            return False
+        # wait for TIMEOUT seconds from the offer to connect to the server
+        self.beginTimer = time.time()
+        return True
 
     def connecting_to_server(self, tcp_socket):
         """
@@ -98,8 +308,13 @@ class Client:
             tcp_socket.settimeout(timeout)  # the program would wait TIMEOUT seconds max for client to connect to server
 
             try:
+                connect_start = time.time()
                 tcp_socket.connect((self.server_ip, self.server_port))
-                tcp_socket.sendall((self.name + "\n").encode())  # send team name
+                self.discovery.record_rtt((self.server_ip, self.server_port), time.time() - connect_start)
+                if self.binary:  # the register frame tells the server we speak the binary protocol
+                    tcp_socket.sendall(pack_register(self.name))
+                else:
+                    tcp_socket.sendall((self.name + "\n").encode())  # send team name
                 return True
 
             except socket.error:
@@ -117,139 +332,181 @@ class Client:
         :rtype: bool
         """
 
-        timeout = TIMEOUT - (time.time() - self.beginTimer)
-        if timeout > 0:
-            # listen for game start message
-            gamestart_message = self.recvall_tcp(tcp_socket, TIMEOUT)
-            if gamestart_message:
-                print(gamestart_message)
-
-                # restart timer - begin game
-                self.beginTimer = time.time()
-
-                # game welcoming message received, start listening for keypress
-                keypress_process = multiprocessing.Process(target=self.get_and_send_keypress, args=(tcp_socket,))
-                keypress_process.start()
-
-                # listen for endgame message
-                endgame_message = ['']
-                endgame_process = multiprocessing.Process(target=self.recv_endgame, args=(tcp_socket,TIMEOUT, endgame_message))
-                endgame_process.start()
-
-                # keep playing until timeout passed - game over
-                while timeout > 0:
-                    timeout = TIMEOUT - (time.time() - self.beginTimer)
-                keypress_process.terminate()
-                endgame_process.terminate()
-
-                # print endgame message
-                if endgame_message[0]:
-                    print(endgame_message[0])
-                    print("Server disconnected, listening for offer requests...")
-                    return True
-
-                # # listen for endgame message
-                # self.beginTimer = time.time()
-                # endgame_message = self.recvall_tcp(tcp_socket, TIMEOUT)
-                # if endgame_message:
-                #     print(endgame_message)
-                #     print("Server disconnected, listening for offer requests...")
-                #     return True
-                else:  # game end message not received correctly
-                    return False
-
-            else:  # game welcoming message not received correctly
+        # listen for game start message for as long as the connection is open - a server whose arenas are all
+        # playing queues the team for the next game, which may start after more than TIMEOUT seconds
+        if self.binary:
+            gamestart_message = self.recv_welcome(tcp_socket, None)
+        else:
+            gamestart_message = self.recvall_tcp(tcp_socket, None)
+        if gamestart_message:
+            print(gamestart_message)
+
+            # restart timer - begin game
+            self.beginTimer = time.time()
+
+            # send key-presses and listen for endgame message until timeout passed - game over
+            endgame_message = self.play(tcp_socket)
+
+            # print endgame message
+            if endgame_message:
+                print(endgame_message)
+                print("Server disconnected, listening for offer requests...")
+                return True
+            else:  # game end message not received correctly
                 return False
-        else:  # timeout passed
+
+        else:  # game welcoming message not received correctly
             return False
 
-    def get_and_send_keypress(self, sock):
+    def play(self, tcp_socket):
         """
-        Using TCP socket to send key-presses caught from keyboard.
-        :param sock: connected server TCP socket
-        :type sock: socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        Single event loop of the game - waits on both the keyboard and the server socket, sends the key-presses in
+        batches and collects the endgame message, until the server closes the connection or timeout passed.
+        :param tcp_socket: connected server TCP socket
+        :type tcp_socket: socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        :return: the endgame message received from the server
+        :rtype: str
         """
 
-        # set timeout
-        timeout = TIMEOUT - (time.time() - self.beginTimer)
-        while True:
+        batcher = KeyBatcher(tcp_socket, socket_policy=self.socket_policy, binary=self.binary)
+        total_data = bytearray()
+        sending = True
 
-            if timeout > 0:
-                keypress = getch.getch()
-                try:
-                    sock.sendall(keypress)
-                except socket.error:
-                    print("server closed. Client stop sending keys")
-                    break
-            else:  # timeout passed
-                break
+        with (self.keyboard or Keyboard()) as keyboard, selectors.DefaultSelector() as selector:
+            selector.register(tcp_socket, selectors.EVENT_READ)
+            if keyboard.fileno() is not None:
+                selector.register(keyboard, selectors.EVENT_READ)
 
-    def recvall_udp(self, sock, length):
+            while True:
+                timeout = TIMEOUT - (time.time() - self.beginTimer)
+                if timeout <= 0:  # timeout passed
+                    break
+                # wake up in time to send the waiting key-presses, and for the synthetic ones that are due
+                for delay in (batcher.time_until_flush(), keyboard.time_until_keys()):
+                    if delay is not None:
+                        timeout = min(timeout, max(delay, 0))
+
+                for key, events in selector.select(timeout):
+                    if key.fileobj is keyboard:
+                        keys = keyboard.read()
+                        if not keys:  # end of input
+                            selector.unregister(keyboard)
+                        elif sending:
+                            sending = self.send_keys(batcher, keys)
+                    else:
+                        try:
+                            received = tcp_socket.recv_into(self.receive_buffer)
+                        except socket.error:
+                            received = 0
+                        if not received:  # server closed the connection - game over
+                            return total_data.decode(errors='replace')
+                        if not self.receive_message(self.receive_view[:received], total_data):
+                            return None
+
+                keys_delay = keyboard.time_until_keys()
+                if sending and keys_delay is not None and keys_delay <= 0:
+                    sending = self.send_keys(batcher, keyboard.read())
+
+                if sending and batcher.is_due():
+                    try:
+                        batcher.flush()
+                    except socket.error:
+                        print("server closed. Client stop sending keys")
+                        sending = False
+
+        return total_data.decode(errors='replace')
+
+    def receive_message(self, data, total_data):
         """
-        Implementing a recvall function over UDP based on predefined messaged length.
-
-        This function throws exception sokect.error
-        that are needed to be caught by caller function were there is a try and a catch
-
-        :param sock: connected server TCP socket
-        :type sock: socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        :param length: Length of expected message
-        :type length: int
-        :return: Tuple of message and sender address
+        Add bytes received from the server during the game to the endgame message. With the binary protocol the
+        message is rendered from the results frame, and the live scores are printed as they arrive.
+        :param data: the received bytes
+        :type data: memoryview
+        :param total_data: the endgame message received so far
+        :type total_data: bytearray
+        :return: If the server follows the protocol
+        :rtype: bool
         """
 
-        message = bytearray()
-        server_ip = None
-        while len(message) < length:
-
-            # recvfrom returns a bytes object and the address of the client socket as a tuple (ip, port)
-            packet, address = sock.recvfrom(BUFFER_SIZE)  # read remaining data
+        if not self.binary:
+            total_data.extend(data)
+            return True
 
-            if not server_ip:
-                server_ip = address[0]
-
-            if not packet:  # EOF - something went wrong
-                return None
-            message.extend(packet)
+        try:
+            frames = self.frames.feed(data)
+        except ValueError:
+            return False
+        for message_type, payload in frames:
+            if message_type == RESULTS:
+                total_data.extend(result_text(*unpack_results(payload)).encode())
+            elif message_type == SCORE:
+                print(score_text(unpack_score(payload)))
+        return True
+
+    def send_keys(self, batcher, keys):
+        """
+        Hand key-presses to the batcher.
+        :param batcher: the key-presses buffer
+        :type batcher: KeyBatcher
+        :param keys: the key-presses
+        :type keys: bytes
+        :return: If the server is still connected
+        :rtype: bool
+        """
 
-        return message, server_ip
+        try:
+            batcher.add(keys)
+            return True
+        except socket.error:
+            print("server closed. Client stop sending keys")
+            return False
 
     def recvall_tcp(self, sock, timelimit):
         """
         Receives message from TCP server according to given timeout
-        :param timelimit: Maximal timeout for receiving
+        :param timelimit: Maximal timeout for receiving, None to wait until the server closes the connection
         :param sock: the tcp socket of the connected server
         :return: return the message received from the server in game mode
         """
-        message = ""
-        total_data = []
-
         # set timeout
-        timeout = timelimit - (time.time() - self.beginTimer)
-        if timeout > 0:
+        timeout = timelimit - (time.time() - self.beginTimer) if timelimit is not None else None
+        if timeout is None or timeout > 0:
             sock.settimeout(timeout)
 
             # receive welcome message
             try:
-                data = sock.recv(BUFFER_SIZE)
-                if data:
-                    total_data.append(data.decode())
+                received = sock.recv_into(self.receive_buffer)
             except socket.error:
                 return None
 
-            # join all parts to make final string
-            message = ''.join(total_data)  # receive game welcoming message from server
-            return message
+            # decoded straight out of the receive buffer
+            return str(self.receive_view[:received], 'utf-8', errors='replace')
         else:  # timeout passed
             return None
 
-    def recv_endgame(self, sock, timelimit, end_message):
+    def recv_welcome(self, sock, timelimit):
         """
-        Receiving end game message and stores it in a single variable mutable list
+        Receives the welcome frame of the binary protocol according to given timeout, however many segments it takes
+        :param timelimit: Maximal timeout for receiving, None to wait until the server closes the connection
         :param sock: the tcp socket of the connected server
-        :param timelimit: Maximal timeout for receiving
-        :param end_message: single variable mutable list for storing message
-        :return: return the message received from the server in game mode
+        :return: the welcoming message rendered from the roster in the frame
         """
+        self.frames = FrameReader(MAX_SERVER_PAYLOAD)
+
+        while True:
+            timeout = timelimit - (time.time() - self.beginTimer) if timelimit is not None else None
+            if timeout is not None and timeout <= 0:  # timeout passed
+                return None
+            sock.settimeout(timeout)
+
+            try:
+                received = sock.recv_into(self.receive_buffer)
+                if not received:  # server closed the connection
+                    return None
+                frames = self.frames.feed(self.receive_view, received)
+            except (socket.error, ValueError):
+                return None
 
-        end_message[0] = self.recvall_tcp(sock, timelimit)
+            for message_type, payload in frames:
+                if message_type == WELCOME:
+                    return welcome_text(unpack_welcome(payload))
@@ -0,0 +1,224 @@
+import socket
+import struct
+import time
+from Protocol import MAGIC_COOKIE, OFFER, unpack_offer
+
+OFFER_PORT = 13117  # udp port the servers broadcast their offers to
+DATAGRAM_SIZE = 2048
+OFFER_WINDOW = 0.5  # seconds offers are collected for after the first one, to choose between servers
+RTT_WEIGHT = 0.125  # weight of a new connect time in the smoothed rtt of a server, as in tcp
+# policies choosing between the servers
+FIRST_SEEN = 'first'
+LOWEST_RTT = 'rtt'
+LEAST_LOADED = 'load'
+
+
+class Offer:
+    """
+        a server that offered a game, with the load of it's lobby if the server sent it
+    """
+
+    __slots__ = ('server_ip', 'server_port', 'received_at', 'capacity', 'players')
+
+    def __init__(self, server_ip, server_port, received_at, capacity=None, players=None):
+        """
+        :param capacity: teams the lobby takes, 0 for no limit, None if the server didn't send it's load
+        :param players: teams already in the lobby, None if the server didn't send it's load
+        """
+
+        self.server_ip = server_ip
+        self.server_port = server_port
+        self.received_at = received_at
+        self.capacity = capacity
+        self.players = players
+
+    def address(self):
+        return self.server_ip, self.server_port
+
+    def is_full(self):
+        return bool(self.capacity) and self.players >= self.capacity
+
+    def load(self):
+        """
+        :return: the part of the lobby that is taken, 0 for a lobby with no limit and 1 if the load is unknown
+        :rtype: float
+        """
+        if self.capacity is None:
+            return 1
+        if not self.capacity:
+            return 0
+        return self.players / self.capacity
+
+
+class DiscoveryPolicy:
+    """
+        chooses the server to connect to among the offers collected in the window
+    """
+
+    def __init__(self, window=OFFER_WINDOW):
+        """
+        :param window: seconds offers are collected for after the first one, 0 to choose the first offer right away
+        """
+
+        self.window = window
+
+    def choose(self, offers, rtts):
+        """
+        :param offers: list of Offer, in the order they were first received, one per server
+        :param rtts: dict of (ip, port) to the smoothed rtt of the servers connected to before
+        :return: the chosen Offer
+        :rtype: Offer
+        """
+        return offers[0]
+
+
+class FirstSeenPolicy(DiscoveryPolicy):
+    """
+        connect to the first server that offers a game, without waiting for others
+    """
+
+    def __init__(self):
+
+        super().__init__(0)
+
+
+class LowestRttPolicy(DiscoveryPolicy):
+    """
+        connect to the server that was the fastest to connect to so far. servers never connected to are tried
+        first, so every server gets measured
+    """
+
+    def choose(self, offers, rtts):
+        return min(offers, key=lambda offer: rtts.get(offer.address(), 0))
+
+
+class LeastLoadedPolicy(DiscoveryPolicy):
+    """
+        connect to the server whose lobby has the most room for it's size, spreading the clients between the
+        servers. servers that don't send their load come last
+    """
+
+    def choose(self, offers, rtts):
+        return min(offers, key=Offer.load)
+
+
+class Discovery:
+    """
+        listens for the udp offers of the servers on a single socket kept open for all the rounds. every datagram
+        is parsed on it's own, so offers of different servers are never mixed. servers whose lobby is full are
+        passed over
+    """
+
+    def __init__(self, client_ip, port=OFFER_PORT, policy=None):
+        """
+        :param client_ip: ip address to listen on for offers
+        :param port: udp port the offers are broadcast to
+        :param policy: DiscoveryPolicy choosing between the servers, FirstSeenPolicy by default
+        """
+
+        self.client_ip = client_ip
+        self.port = port
+        self.policy = policy or FirstSeenPolicy()
+        self.rtts = {}  # (ip, port) of a server to it's smoothed rtt
+        self.sock = None
+
+    def open(self):
+        """
+            bind the offer socket, other clients on the host may listen on the same port
+        """
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.sock.bind((self.client_ip, self.port))
+
+    def close(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    def discard_stale(self):
+        """
+            drop the offers that were queued on the socket while we were playing
+        """
+
+        self.sock.setblocking(False)
+        try:
+            while True:
+                self.sock.recvfrom(DATAGRAM_SIZE)
+        except BlockingIOError:
+            pass
+
+    def receive_offer(self, timeout):
+        """
+            wait for a single valid offer.
+            This function throws exception socket.error
+        :param timeout: seconds to wait, None to wait for good
+        :return: the Offer, None if timeout passed
+        :rtype: Offer
+        """
+
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            if deadline is None:
+                self.sock.settimeout(None)
+            else:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self.sock.settimeout(remaining)
+
+            try:
+                datagram, address = self.sock.recvfrom(DATAGRAM_SIZE)
+            except socket.timeout:
+                return None
+
+            try:
+                magic_cookie, message_type, server_port, capacity, players = unpack_offer(datagram)
+            except struct.error:
+                print("Ignoring a short offer from {IP}".format(IP=address[0]))
+                continue
+            if magic_cookie != MAGIC_COOKIE:
+                print("the message is rejected not a magic cookie")
+                continue
+            if message_type != OFFER:
+                print("only 0x2 offer types are supported")
+                continue
+            return Offer(address[0], server_port, time.time(), capacity, players)
+
+    def discover(self):
+        """
+            wait for offers and choose a server - the first offer opens the window of the policy, and the servers
+            offering a game within it are handed to the policy
+        :return: the chosen Offer
+        :rtype: Offer
+        """
+
+        if not self.sock:
+            self.open()
+        self.discard_stale()
+
+        first = self.receive_offer(None)
+        while first.is_full():
+            first = self.receive_offer(None)
+
+        offers = {first.address(): first}  # the latest offer of every server, in the order they were first seen
+        deadline = first.received_at + self.policy.window
+        while time.time() < deadline:
+            offer = self.receive_offer(deadline - time.time())
+            if offer is None:
+                break
+            offers[offer.address()] = offer
+
+        return self.policy.choose([offer for offer in offers.values() if not offer.is_full()] or [first], self.rtts)
+
+    def record_rtt(self, address, seconds):
+        """
+            update the smoothed rtt of a server with the time it took to connect to it
+        :param address: (ip, port) of the server
+        :param seconds: seconds the tcp handshake took
+        """
+
+        previous = self.rtts.get(address)
+        self.rtts[address] = seconds if previous is None else previous + RTT_WEIGHT * (seconds - previous)
@@ -0,0 +1,131 @@
+import selectors
+import socket
+import time
+
+FANOUT_TIMEOUT = 2  # seconds every client has to read a message before it is dropped
+DRAIN_SIZE = 4096
+
+
+class FanOut:
+    """
+        writes messages to many sockets at once from a single selector loop, so a client that doesn't read only
+        delays itself. every distinct payload is shared by all the sockets it is written to through a memoryview
+    """
+
+    def __init__(self, timeout=FANOUT_TIMEOUT, close=False):
+        """
+        :param timeout: seconds every client has to read it's message, slower clients are dropped
+        :param close: close the connections once the message is delivered - the sending side is shut down first
+                      and whatever the client still sends is read until it closes too, so the message isn't lost
+                      to a reset caused by closing with unread data
+        """
+
+        self.timeout = timeout
+        self.close = close
+        self.drain_buffer = bytearray(DRAIN_SIZE) if close else None  # what the clients send is read into it
+
+    def send(self, deliveries):
+        """
+            write every payload to it's socket, without blocking on any of them
+        :param deliveries: iterable of (socket, payload) pairs
+        :return: number of clients the message was dropped for, because they were too slow or failed
+        :rtype: int
+        """
+
+        deadline = time.time() + self.timeout
+        views = {}  # memoryview of every distinct payload
+        selector = selectors.DefaultSelector()
+        timeouts = []
+        dropped = 0
+
+        for sock, payload in deliveries:
+            if id(payload) not in views:
+                views[id(payload)] = memoryview(payload)
+            try:
+                timeouts.append((sock, sock.gettimeout()))
+                sock.setblocking(False)
+                # [view, offset] - the part that is still unsent
+                selector.register(sock, selectors.EVENT_WRITE, [views[id(payload)], 0])
+            except (ValueError, OSError):  # socket already closed
+                dropped += 1
+
+        try:
+            while selector.get_map():
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                for key, events in selector.select(timeout):
+                    if events & selectors.EVENT_WRITE:
+                        if not self.write(selector, key):
+                            dropped += 1
+                    else:
+                        self.drain(selector, key.fileobj)
+
+            # the clients left are too slow
+            for key in list(selector.get_map().values()):
+                if key.events & selectors.EVENT_WRITE:
+                    dropped += 1
+                self.finish(selector, key.fileobj)
+        finally:
+            selector.close()
+            if not self.close:
+                for sock, timeout in timeouts:
+                    try:
+                        sock.settimeout(timeout)
+                    except OSError:
+                        pass
+
+        return dropped
+
+    def write(self, selector, key):
+        """
+            write as much of the payload as the socket takes
+        :return: False if the client failed
+        :rtype: bool
+        """
+
+        sock = key.fileobj
+        view, offset = key.data
+        try:
+            offset += sock.send(view[offset:])
+        except BlockingIOError:
+            return True
+        except socket.error:
+            self.finish(selector, sock)
+            return False
+
+        if offset < len(view):
+            key.data[1] = offset
+        elif self.close:
+            try:
+                sock.shutdown(socket.SHUT_WR)  # the client reads the message then the end of the stream
+                selector.modify(sock, selectors.EVENT_READ)
+            except socket.error:
+                self.finish(selector, sock)
+        else:
+            selector.unregister(sock)
+        return True
+
+    def drain(self, selector, sock):
+        """
+            read and discard what a client sends after it's message was delivered, until it closes the connection
+        """
+
+        try:
+            received = sock.recv_into(self.drain_buffer)
+        except BlockingIOError:
+            return
+        except socket.error:
+            received = 0
+        if not received:
+            self.finish(selector, sock)
+
+    def finish(self, selector, sock):
+        """
+            stop writing to a socket, closing it if close is set. without close a dropped socket is left open, it is
+            still in it's game and the owner of the connection decides what to do with it
+        """
+
+        selector.unregister(sock)
+        if self.close:
+            sock.close()
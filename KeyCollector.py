@@ -0,0 +1,58 @@
+import selectors
+import time
+
+
+class KeyCollector:
+
+    def __init__(self, receive):
+        """
+        :param receive: callback invoked with the data of a connection whenever its socket is readable.
+                        it should return False once the connection is finished (closed or failed)
+        :type receive: callable
+        """
+
+        self.receive = receive
+
+    def collect(self, connections, deadline, tick=None, tick_interval=None):
+        """
+            multiplexes every connection from a single loop until the deadline passes or every connection is done.
+            sockets are switched to non-blocking mode for the duration of the round and restored afterwards
+        :param connections: iterable of (socket, data) pairs, data is handed back to the receive callback
+        :param deadline: absolute time (time.time()) when the collection ends
+        :param tick: optional callback invoked from the loop every tick_interval seconds
+        :param tick_interval: seconds between two ticks
+        """
+
+        selector = selectors.DefaultSelector()
+        timeouts = []
+        for sock, data in connections:
+            try:
+                timeouts.append((sock, sock.gettimeout()))
+                sock.setblocking(False)
+                selector.register(sock, selectors.EVENT_READ, data)
+            except (ValueError, OSError):  # socket already closed
+                continue
+
+        next_tick = time.time() + tick_interval if tick else None
+        try:
+            while selector.get_map():
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                if next_tick is not None:
+                    timeout = min(timeout, max(next_tick - time.time(), 0))
+
+                for key, events in selector.select(timeout):
+                    if not self.receive(key.data):
+                        selector.unregister(key.fileobj)
+
+                if next_tick is not None and time.time() >= next_tick:
+                    tick()
+                    next_tick = time.time() + tick_interval
+        finally:
+            selector.close()
+            for sock, timeout in timeouts:
+                try:
+                    sock.settimeout(timeout)
+                except OSError:
+                    pass
@@ -0,0 +1,238 @@
+import atexit
+import queue
+import sqlite3
+import threading
+import time
+
+LEADERBOARD_PATH = 'leaderboard.db'
+FLUSH_INTERVAL = 1  # maximal seconds a finished game waits before it is written
+MAX_BATCH = 256  # most games written in a single transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    played_at REAL NOT NULL,
+    winner_group INTEGER NOT NULL,
+    winner_sum INTEGER NOT NULL,
+    loser_sum INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_by_winner_sum ON games (winner_sum DESC, id);
+CREATE INDEX IF NOT EXISTS games_by_loser_sum ON games (loser_sum);
+CREATE TABLE IF NOT EXISTS group_sums (
+    game_id INTEGER NOT NULL REFERENCES games (id),
+    group_number INTEGER NOT NULL,
+    sum INTEGER NOT NULL,
+    PRIMARY KEY (game_id, group_number)
+);
+CREATE TABLE IF NOT EXISTS teams (
+    game_id INTEGER NOT NULL REFERENCES games (id),
+    name TEXT NOT NULL,
+    group_number INTEGER NOT NULL,
+    keys INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS teams_by_game ON teams (game_id, group_number);
+CREATE TABLE IF NOT EXISTS team_bests (
+    name TEXT PRIMARY KEY,
+    best_keys INTEGER NOT NULL,
+    games INTEGER NOT NULL,
+    last_played REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS team_bests_by_keys ON team_bests (best_keys DESC);
+"""
+# databases written before the sums of the groups got their own table kept the sums of the first two groups in the
+# games table, the sums of the other groups are the keys of their teams
+MIGRATE_GROUP_SUMS = """
+BEGIN;
+INSERT OR IGNORE INTO group_sums (game_id, group_number, sum) SELECT id, 1, sum_group1 FROM games;
+INSERT OR IGNORE INTO group_sums (game_id, group_number, sum) SELECT id, 2, sum_group2 FROM games
+    WHERE sum_group2 != 0 OR EXISTS (SELECT 1 FROM teams WHERE game_id = games.id AND group_number = 2);
+INSERT OR IGNORE INTO group_sums (game_id, group_number, sum) SELECT game_id, group_number, SUM(keys) FROM teams
+    WHERE group_number > 2 GROUP BY game_id, group_number;
+CREATE TABLE migrated_games (
+    id INTEGER PRIMARY KEY,
+    played_at REAL NOT NULL,
+    winner_group INTEGER NOT NULL,
+    winner_sum INTEGER NOT NULL,
+    loser_sum INTEGER NOT NULL
+);
+INSERT INTO migrated_games (id, played_at, winner_group, winner_sum, loser_sum)
+    SELECT id, played_at, winner_group, winner_sum, loser_sum FROM games;
+DROP TABLE games;
+ALTER TABLE migrated_games RENAME TO games;
+COMMIT;
+"""
+
+
+class Leaderboard:
+    """
+        all time records kept in an sqlite database - every game with it's sums, the teams of every group and the
+        keys each team typed. finished games are queued and written in batches by a writer thread, so the end of
+        the game never waits for the disk. the best result of every team is kept up to date as games are written,
+        so rankings are read from an index instead of going over all the games
+    """
+
+    def __init__(self, path=LEADERBOARD_PATH, flush_interval=FLUSH_INTERVAL):
+        """
+        :param path: the sqlite database file, created if it doesn't exist
+        :param flush_interval: maximal seconds a finished game waits before it is written
+        """
+
+        self.path = path
+        self.flush_interval = flush_interval
+        self.games = queue.Queue()  # finished games waiting to be written, None stops the writer
+
+        with sqlite3.connect(path) as connection:
+            connection.executescript(SCHEMA)
+            columns = [column[1] for column in connection.execute("PRAGMA table_info(games)")]
+            if 'sum_group1' in columns:
+                connection.executescript(MIGRATE_GROUP_SUMS)
+                connection.executescript(SCHEMA)  # the indexes of the games table were dropped with it
+        # queries may come from any thread, the writer has it's own connection
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+
+        self.writer = threading.Thread(target=self.write_games, args=(), daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+
+    def record_game(self, sums, rosters, keys=None):
+        """
+            queue a finished game to be written, returns right away
+        :param sums: the number of keys typed by every group
+        :param rosters: the names of the teams of every group
+        :param keys: the number of keys typed by every team of every group, in the order of rosters
+        """
+
+        if not keys:
+            keys = [[0] * len(names) for names in rosters]
+        self.games.put((time.time(), list(sums), [list(names) for names in rosters], [list(group) for group in keys]))
+
+    def write_games(self):
+        """
+            writer thread - write the queued games in batches until close is called
+        """
+
+        connection = sqlite3.connect(self.path)
+        running = True
+        while running:
+            game = self.games.get()
+            if game is None:
+                break
+
+            # gather the games finishing in the next flush_interval into the same transaction
+            batch = [game]
+            deadline = time.time() + self.flush_interval
+            while len(batch) < MAX_BATCH:
+                try:
+                    game = self.games.get(timeout=max(deadline - time.time(), 0))
+                except queue.Empty:
+                    break
+                if game is None:
+                    running = False
+                    break
+                batch.append(game)
+
+            try:
+                with connection:
+                    for game in batch:
+                        self.insert_game(connection, *game)
+            except sqlite3.Error as error:
+                print("failed to write {count} games to the leaderboard: {error}".format(count=len(batch),
+                                                                                          error=error))
+        connection.close()
+
+    def insert_game(self, connection, played_at, sums, rosters, keys):
+        """
+            insert a game with the sum of every group and it's teams, and update the best result of every team.
+            on a draw the first of the tied groups is the winner
+        """
+
+        winner_sum = max(sums)
+        game_id = connection.execute(
+            "INSERT INTO games (played_at, winner_group, winner_sum, loser_sum) VALUES (?, ?, ?, ?)",
+            (played_at, sums.index(winner_sum) + 1, winner_sum, min(sums))).lastrowid
+        connection.executemany("INSERT INTO group_sums (game_id, group_number, sum) VALUES (?, ?, ?)",
+                               [(game_id, number + 1, group_sum) for number, group_sum in enumerate(sums)])
+
+        teams = [(game_id, name, number + 1, team_keys) for number in range(len(rosters))
+                 for name, team_keys in zip(rosters[number], keys[number])]
+        connection.executemany("INSERT INTO teams (game_id, name, group_number, keys) VALUES (?, ?, ?, ?)", teams)
+        connection.executemany("INSERT OR IGNORE INTO team_bests (name, best_keys, games, last_played) "
+                               "VALUES (?, 0, 0, ?)", [(team[1], played_at) for team in teams])
+        connection.executemany("UPDATE team_bests SET best_keys = MAX(best_keys, ?), games = games + 1, "
+                               "last_played = ? WHERE name = ?", [(team[3], played_at, team[1]) for team in teams])
+
+    def close(self):
+        """
+            write the games that are still queued and stop the writer
+        """
+
+        if self.writer.is_alive():
+            self.games.put(None)
+            self.writer.join()
+
+    def query(self, sql, parameters=()):
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def records(self):
+        """
+        :return: the maximum and the minimum scores ever - the highest sum of a winning group and the lowest sum of
+                 a losing group, None for both if no game was played
+        :rtype: tuple
+        """
+
+        # separate queries, so each is answered from the end of it's index
+        max_score = self.query("SELECT MAX(winner_sum) FROM games")[0][0]
+        min_score = self.query("SELECT MIN(loser_sum) FROM games")[0][0]
+        return max_score, min_score
+
+    def best_teams(self):
+        """
+        :return: the maximum score ever and the names of the teams in the group that scored it first,
+                 (0, []) if no game was played
+        :rtype: tuple
+        """
+
+        best = self.query("SELECT id, winner_group, winner_sum FROM games ORDER BY winner_sum DESC, id LIMIT 1")
+        if not best:
+            return 0, []
+        game_id, winner_group, winner_sum = best[0]
+        names = self.query("SELECT name FROM teams WHERE game_id = ? AND group_number = ? ORDER BY rowid",
+                           (game_id, winner_group))
+        return winner_sum, [name for name, in names]
+
+    def top_games(self, k):
+        """
+        :param k: number of games
+        :return: list of (played_at, winner_group, sums) of the k games with the highest winning sums, sums holds
+                 the sum of every group
+        :rtype: list
+        """
+
+        games = self.query("SELECT id, played_at, winner_group FROM games ORDER BY winner_sum DESC, id LIMIT ?", (k,))
+        sums = {game[0]: [] for game in games}
+        for game_id, group_sum in self.query("SELECT game_id, sum FROM group_sums WHERE game_id IN ({}) "
+                                             "ORDER BY game_id, group_number".format(", ".join("?" * len(games))),
+                                             list(sums)):
+            sums[game_id].append(group_sum)
+        return [(played_at, winner_group, sums[game_id]) for game_id, played_at, winner_group in games]
+
+    def top_teams(self, k):
+        """
+        :param k: number of teams
+        :return: list of (name, best_keys, games) of the k teams that typed the most keys in a game
+        :rtype: list
+        """
+
+        return self.query("SELECT name, best_keys, games FROM team_bests ORDER BY best_keys DESC LIMIT ?", (k,))
+
+    def team_best(self, name):
+        """
+        :param name: the name of the team
+        :return: (best_keys, games, last_played) of the team, None if it never played
+        :rtype: tuple
+        """
+
+        rows = self.query("SELECT best_keys, games, last_played FROM team_bests WHERE name = ?", (name,))
+        return rows[0] if rows else None
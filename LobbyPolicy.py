@@ -0,0 +1,91 @@
+LOBBY_WINDOW = 10  # maximal time in seconds the lobby stays open
+
+
+class LobbyPolicy:
+    """
+        decides when the lobby closes and the game starts.
+        the lobby closes when the window is over, or earlier once max_players teams registered
+    """
+
+    def __init__(self, window=LOBBY_WINDOW, max_players=None):
+        """
+        :param window: maximal time in seconds the lobby stays open
+        :param max_players: number of teams that fills the lobby, None for no limit
+        """
+
+        self.window = window
+        self.max_players = max_players
+
+    def reset(self):
+        """
+            called when a new lobby opens
+        """
+        pass
+
+    def is_full(self, players):
+        """
+        :param players: number of registered teams
+        :return: if no more teams can join the lobby
+        :rtype: bool
+        """
+        return self.max_players is not None and players >= self.max_players
+
+    def time_left(self, players, elapsed):
+        """
+        :param players: number of registered teams
+        :param elapsed: seconds since the lobby opened
+        :return: seconds left until the game starts, 0 or less to start it now
+        :rtype: float
+        """
+        if self.is_full(players):
+            return 0
+        return self.window - elapsed
+
+
+class FixedWindowPolicy(LobbyPolicy):
+    """
+        the game starts when the lobby window is over, however many teams joined
+    """
+
+    def __init__(self, window=LOBBY_WINDOW):
+
+        super().__init__(window)
+
+
+class MaxPlayersPolicy(LobbyPolicy):
+    """
+        the game starts as soon as the lobby is full, or when the window is over
+    """
+
+    def __init__(self, max_players, window=LOBBY_WINDOW):
+
+        super().__init__(window, max_players)
+
+
+class QuorumPolicy(LobbyPolicy):
+    """
+        the game starts a grace period after min_players teams registered, when the lobby is full,
+        or when the window is over - the earliest of them
+    """
+
+    def __init__(self, min_players, grace, window=LOBBY_WINDOW, max_players=None):
+        """
+        :param min_players: number of teams needed to start the game
+        :param grace: seconds to wait for more teams once min_players registered
+        """
+
+        super().__init__(window, max_players)
+        self.min_players = min_players
+        self.grace = grace
+        self.quorum_reached = None  # seconds since the lobby opened when the quorum was reached
+
+    def reset(self):
+        self.quorum_reached = None
+
+    def time_left(self, players, elapsed):
+        time_left = super().time_left(players, elapsed)
+        if self.quorum_reached is None and players >= self.min_players:
+            self.quorum_reached = elapsed
+        if self.quorum_reached is not None:
+            time_left = min(time_left, self.quorum_reached + self.grace - elapsed)
+        return time_left
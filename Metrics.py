@@ -0,0 +1,254 @@
+import bisect
+import cProfile
+import json
+import os
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+METRICS_ADDRESS = '127.0.0.1'  # the endpoint is local only
+# upper bounds of the histogram buckets
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+RATE_BUCKETS = (1, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+CPU_PROFILE = 'cpu'
+MEMORY_PROFILE = 'memory'
+MEMORY_TOP = 25  # lines of the memory profile dump
+
+
+class Histogram:
+    """
+        counts of observed values per bucket, with their sum - cumulative buckets as prometheus expects them
+    """
+
+    def __init__(self, buckets):
+
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """
+        :return: list of (upper bound, observations up to it), the last upper bound is '+Inf'
+        :rtype: list
+        """
+        total = 0
+        result = []
+        for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class Metrics:
+    """
+        counters, gauges and histograms of a server. updates take a lock, so the hot paths add their counts up
+        locally and report them once per round
+    """
+
+    def __init__(self):
+
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.started = time.time()
+
+    def increment(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS):
+        """
+            add a value to a histogram, created with the buckets on it's first observation
+        """
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram(buckets)
+            self.histograms[name].observe(value)
+
+    def sample(self):
+        """
+            update the gauges that are read from the process when the metrics are rendered
+        """
+        self.set_gauge('active_threads', threading.active_count())
+        self.set_gauge('uptime_seconds', time.time() - self.started)
+
+    def render_prometheus(self):
+        """
+        :return: the metrics in the prometheus text exposition format
+        :rtype: str
+        """
+        self.sample()
+        lines = []
+        with self.lock:
+            for name, value in sorted(self.counters.items()):
+                lines.append("# TYPE {name} counter\n{name} {value}".format(name=name, value=value))
+            for name, value in sorted(self.gauges.items()):
+                lines.append("# TYPE {name} gauge\n{name} {value}".format(name=name, value=value))
+            for name, histogram in sorted(self.histograms.items()):
+                lines.append("# TYPE {name} histogram".format(name=name))
+                for bound, count in histogram.cumulative():
+                    lines.append('{name}_bucket{{le="{bound}"}} {count}'.format(name=name, bound=bound, count=count))
+                lines.append("{name}_sum {sum}\n{name}_count {count}".format(name=name, sum=histogram.sum,
+                                                                             count=histogram.count))
+        return "\n".join(lines) + "\n"
+
+    def render_json(self):
+        """
+        :return: the metrics as a json document
+        :rtype: str
+        """
+        self.sample()
+        with self.lock:
+            document = {'counters': dict(self.counters), 'gauges': dict(self.gauges),
+                        'histograms': {name: {'buckets': histogram.cumulative(), 'sum': histogram.sum,
+                                              'count': histogram.count}
+                                       for name, histogram in self.histograms.items()}}
+        return json.dumps(document, sort_keys=True)
+
+
+class NullMetrics:
+    """
+        the metrics of a server that isn't instrumented - every update does nothing
+    """
+
+    def increment(self, name, value=1):
+        pass
+
+    def set_gauge(self, name, value):
+        pass
+
+    def observe(self, name, value, buckets=SECONDS_BUCKETS):
+        pass
+
+
+NO_METRICS = NullMetrics()  # shared by all the servers that aren't instrumented
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+        GET /metrics for the prometheus text format, GET /metrics.json for json
+    """
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            body, content_type = self.server.metrics.render_prometheus(), 'text/plain; version=0.0.4'
+        elif self.path == '/metrics.json':
+            body, content_type = self.server.metrics.render_json(), 'application/json'
+        else:
+            self.send_error(404)
+            return
+        encoded = body.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format, *args):
+        pass  # scrapes aren't worth a line on the console
+
+
+class MetricsEndpoint(ThreadingMixIn, HTTPServer):
+    """
+        local http endpoint serving the metrics of a server from a daemon thread
+    """
+
+    daemon_threads = True
+
+    def __init__(self, metrics, port, address=METRICS_ADDRESS):
+
+        super().__init__((address, port), MetricsHandler)
+        self.metrics = metrics
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, args=(), daemon=True).start()
+
+
+class RoundProfiler:
+    """
+        profiles every round and dumps the profile to a file - cProfile statistics of the thread playing the round,
+        or the top allocations seen by tracemalloc. tracemalloc is global to the process, so concurrent rounds
+        share it - it runs as long as a round is profiled
+    """
+
+    def __init__(self, kind, directory='.'):
+        """
+        :param kind: CPU_PROFILE or MEMORY_PROFILE
+        :param directory: where the dumps are written
+        """
+
+        self.kind = kind
+        self.directory = directory
+        self.rounds = 0
+        self.tracing = 0  # rounds currently traced by tracemalloc
+        self.lock = threading.Lock()
+
+    def start(self):
+        """
+            start profiling a round from the thread that plays it
+        :return: the session to hand to stop
+        :rtype: tuple
+        """
+        with self.lock:
+            self.rounds += 1
+            path = os.path.join(self.directory, "round-{pid}-{round}.{suffix}".format(
+                pid=os.getpid(), round=self.rounds, suffix='prof' if self.kind == CPU_PROFILE else 'txt'))
+            if self.kind == MEMORY_PROFILE:
+                if not self.tracing:
+                    tracemalloc.start()
+                self.tracing += 1
+                return path, None
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # another round is being profiled and the interpreter allows a single profiler
+            return None, None
+        return path, profiler
+
+    def stop(self, session):
+        """
+            stop profiling a round and dump it's profile
+        :param session: returned by start
+        """
+        path, profiler = session
+        if path is None:  # the round wasn't profiled
+            return
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(path)
+            return
+
+        with self.lock:
+            snapshot = tracemalloc.take_snapshot()
+            self.tracing -= 1
+            if not self.tracing:
+                tracemalloc.stop()
+        with open(path, 'w') as dump:
+            for statistic in snapshot.statistics('lineno')[:MEMORY_TOP]:
+                dump.write(str(statistic) + "\n")
+
+    def profile(self, function, *args):
+        """
+            call the function playing a round under the profiler
+        :return: what the function returned
+        """
+        session = self.start()
+        try:
+            return function(*args)
+        finally:
+            self.stop(session)
@@ -0,0 +1,370 @@
+import struct
+
+MAGIC_COOKIE = 0xfeedbeef
+PROTOCOL_VERSION = 1
+# message types, 0x2 is the udp offer
+OFFER = 0x2
+REGISTER = 0x3  # client -> server: protocol version and team name
+WELCOME = 0x4  # server -> client: the roster of every group
+KEYS = 0x5  # client -> server: number of key-presses since the last frame
+RESULTS = 0x6  # server -> client: the sums of the groups, the winners and the all time records
+SCORE = 0x7  # server -> client: live totals of the groups during the game
+
+# every tcp frame starts with a header modeled on the udp offer - magic cookie, message type and payload length
+HEADER = struct.Struct("!IbI")
+VERSION = struct.Struct("!B")
+COUNT = struct.Struct("!H")
+NAME_LENGTH = struct.Struct("!B")
+SUM = struct.Struct("!I")
+RECORDS = struct.Struct("!II")
+# the udp offer keeps the native layout the servers always sent. the load of the server may follow it, but older
+# clients unpack the whole datagram as the offer and ignore longer ones, so servers only send it when asked to.
+# offers without the load are still understood by the new clients
+OFFER_HEADER = struct.Struct("IbH")  # magic cookie, message type, tcp port
+OFFER_LOAD = struct.Struct("!HH")  # capacity of the lobby (0 for no limit) and teams already in it
+MAX_CLIENT_PAYLOAD = 256  # largest frame a client may send, register frames are the largest
+MAX_SERVER_PAYLOAD = 16 * 1024 * 1024  # largest frame the server may send
+
+
+def pack_frame(message_type, payload=b''):
+    """
+        pack a frame - header followed by the payload
+    :param message_type: REGISTER, WELCOME, KEYS, RESULTS or SCORE
+    :param payload: packed payload
+    :rtype: bytes
+    """
+    return HEADER.pack(MAGIC_COOKIE, message_type, len(payload)) + payload
+
+
+def is_binary(data):
+    """
+    :param data: the first bytes a client sent
+    :return: if they could be the beginning of a frame, text team names never start with the magic cookie
+    :rtype: bool
+    """
+    cookie = HEADER.pack(MAGIC_COOKIE, 0, 0)[:4]
+    return len(data) > 0 and cookie.startswith(bytes(data[:4]))
+
+
+def pack_names(names):
+    """
+        pack a list of team names - their count, then every name prefixed by it's length
+    """
+    parts = [COUNT.pack(len(names))]
+    for name in names:
+        encoded = name.encode()[:255]
+        parts.append(NAME_LENGTH.pack(len(encoded)))
+        parts.append(encoded)
+    return b''.join(parts)
+
+
+def unpack_names(payload, offset):
+    """
+        unpack a list of team names packed by pack_names
+    :return: the names and the offset following them
+    :rtype: tuple
+    """
+    count, = COUNT.unpack_from(payload, offset)
+    offset += COUNT.size
+    names = []
+    for i in range(count):
+        length, = NAME_LENGTH.unpack_from(payload, offset)
+        offset += NAME_LENGTH.size
+        names.append(bytes(payload[offset:offset + length]).decode(errors='replace'))
+        offset += length
+    return names, offset
+
+
+class FrameReader:
+    """
+        incremental reader of frames from a tcp stream
+    """
+
+    def __init__(self, max_payload=MAX_SERVER_PAYLOAD):
+
+        self.max_payload = max_payload
+        self.buffer = bytearray()
+
+    def feed(self, data, size=None):
+        """
+            add received bytes
+        :param data: the received bytes, or a buffer starting with them
+        :param size: number of bytes received at the beginning of data, all of data by default
+        :return: list of the (message type, payload) frames completed by the bytes
+        :rtype: list
+        :raises ValueError: if a frame doesn't start with the magic cookie or is too long
+        """
+        self.buffer.extend(data if size is None else memoryview(data)[:size])
+        frames = []
+        while len(self.buffer) >= HEADER.size:
+            magic_cookie, message_type, length = HEADER.unpack_from(self.buffer)
+            if magic_cookie != MAGIC_COOKIE:
+                raise ValueError("the frame doesn't start with the magic cookie")
+            if length > self.max_payload:
+                raise ValueError("frame of {} bytes is too long".format(length))
+            if len(self.buffer) < HEADER.size + length:
+                break
+            frames.append((message_type, bytes(self.buffer[HEADER.size:HEADER.size + length])))
+            del self.buffer[:HEADER.size + length]
+        return frames
+
+
+def welcome_text(rosters):
+    """
+        the welcoming message listing the names of the teams in each group
+    :param rosters: list of the names of the teams of every group
+    """
+    welcoming_message = "Welcome to Keyboard Spamming Battle Royale."
+    for number, names in enumerate(rosters):
+        welcoming_message += "\nGroup {number}:\n==\n".format(number=number + 1)
+        for name in names:
+            welcoming_message += name + "\n"  # add the name of each group
+    welcoming_message += "\nStart pressing keys on your keyboard as fast as you can!!\n"
+
+    return welcoming_message
+
+
+def result_text(sums, rosters, max_score, min_score, best_team_ever):
+    """
+        the end of the game message - the sums of the groups, the winners and the all time records
+    :param sums: the number of keys typed by every group
+    :param rosters: list of the names of the teams of every group
+    """
+    top = max(sums)
+    winners = [number for number, group_sum in enumerate(sums) if group_sum == top]
+    groups = " and ".join("Group {}".format(number + 1) for number in winners)
+    typed = " ".join("Group {number} typed in {sum} characters.".format(number=number + 1, sum=group_sum)
+                     for number, group_sum in enumerate(sums))
+
+    if len(winners) == len(sums):  # every group typed the same
+        message = "\nGame over!\n{groups} typed in {sum} characters. It's a draw! ".format(groups=groups, sum=top)
+    else:
+        if len(winners) == 1:
+            message = "\nGame over!\n{typed}\n{groups} wins!".format(typed=typed, groups=groups)
+        else:
+            message = "\nGame over!\n{typed}\nIt's a draw between {groups}!".format(typed=typed, groups=groups)
+        message += "\n\nCongratulations to the winners:\n=="
+        for number in winners:
+            for name in rosters[number]:
+                message += "\n" + name
+    message += "\nThe maximum score ever was: {max}\nThe minimum score ever was: {min}\n".format(max=max_score,
+                                                                                             min=min_score)
+    message += "\nThe best teams to play the game are:\n=="
+    for name in best_team_ever:
+        message += "\n" + name
+
+    return message
+
+
+def score_text(sums):
+    return " ".join("Group {number}: {sum}".format(number=number + 1, sum=group_sum)
+                    for number, group_sum in enumerate(sums))
+
+
+def pack_offer(port, load=None):
+    """
+        pack the udp offer of a server
+    :param port: tcp port of the server
+    :param load: (capacity, players) of the lobby, capacity is None for no limit. None to leave the load out
+    :rtype: bytes
+    """
+    offer = OFFER_HEADER.pack(MAGIC_COOKIE, OFFER, port)
+    if load is None:
+        return offer
+    capacity, players = load
+    return offer + OFFER_LOAD.pack(min(capacity or 0, 0xffff), min(players, 0xffff))
+
+
+def unpack_offer(datagram):
+    """
+        unpack a udp offer, with or without the load.
+        This function throws exception struct.error if the datagram is too short
+    :return: magic cookie, message type, tcp port, capacity and players - capacity is 0 for no limit, capacity and
+             players are None if the server didn't send it's load
+    :rtype: tuple
+    """
+    magic_cookie, message_type, port = OFFER_HEADER.unpack_from(datagram)
+    if len(datagram) < OFFER_HEADER.size + OFFER_LOAD.size:
+        return magic_cookie, message_type, port, None, None
+    capacity, players = OFFER_LOAD.unpack_from(datagram, OFFER_HEADER.size)
+    return magic_cookie, message_type, port, capacity, players
+
+
+def pack_register(name):
+    return pack_frame(REGISTER, VERSION.pack(PROTOCOL_VERSION) + name.encode())
+
+
+def unpack_register(payload):
+    """
+    :return: the protocol version and the team name
+    :rtype: tuple
+    :raises ValueError: if the payload is too short or the name isn't valid utf-8
+    """
+    if len(payload) < VERSION.size:
+        raise ValueError("register frame of {} bytes is too short".format(len(payload)))
+    version, = VERSION.unpack_from(payload)
+    return version, payload[VERSION.size:].decode()
+
+
+def pack_keys(count):
+    return pack_frame(KEYS, COUNT.pack(count))
+
+
+def unpack_keys(payload):
+    """
+    :return: the number of key-presses in a key frame
+    :rtype: int
+    :raises ValueError: if the payload isn't a count
+    """
+    if len(payload) != COUNT.size:
+        raise ValueError("key frame of {} bytes instead of {}".format(len(payload), COUNT.size))
+    return COUNT.unpack(payload)[0]
+
+
+def pack_rosters(rosters):
+    """
+        pack the names of the teams of every group - the number of groups, then the names of every group
+    """
+    return COUNT.pack(len(rosters)) + b''.join(pack_names(names) for names in rosters)
+
+
+def unpack_rosters(payload, offset):
+    """
+        unpack the rosters packed by pack_rosters
+    :return: the rosters and the offset following them
+    :rtype: tuple
+    """
+    count, = COUNT.unpack_from(payload, offset)
+    offset += COUNT.size
+    rosters = []
+    for i in range(count):
+        names, offset = unpack_names(payload, offset)
+        rosters.append(names)
+    return rosters, offset
+
+
+def pack_sums(sums):
+    """
+        pack the number of keys typed by every group - the number of groups then every sum
+    """
+    return COUNT.pack(len(sums)) + b''.join(SUM.pack(group_sum) for group_sum in sums)
+
+
+def unpack_sums(payload, offset):
+    """
+        unpack the sums packed by pack_sums
+    :return: the sums and the offset following them
+    :rtype: tuple
+    """
+    count, = COUNT.unpack_from(payload, offset)
+    offset += COUNT.size
+    sums = [SUM.unpack_from(payload, offset + i * SUM.size)[0] for i in range(count)]
+    return sums, offset + count * SUM.size
+
+
+def pack_welcome(rosters):
+    return pack_frame(WELCOME, pack_rosters(rosters))
+
+
+def unpack_welcome(payload):
+    """
+    :return: the names of the teams of every group
+    :rtype: list
+    """
+    return unpack_rosters(payload, 0)[0]
+
+
+def pack_results(sums, rosters, max_score, min_score, best_team_ever):
+    return pack_frame(RESULTS, pack_sums(sums) + pack_rosters(rosters) + RECORDS.pack(max_score, min_score) +
+                      pack_names(best_team_ever))
+
+
+def unpack_results(payload):
+    """
+    :return: the arguments of result_text
+    :rtype: tuple
+    """
+    sums, offset = unpack_sums(payload, 0)
+    rosters, offset = unpack_rosters(payload, offset)
+    max_score, min_score = RECORDS.unpack_from(payload, offset)
+    best_team_ever, offset = unpack_names(payload, offset + RECORDS.size)
+    return sums, rosters, max_score, min_score, best_team_ever
+
+
+def pack_score(sums):
+    return pack_frame(SCORE, pack_sums(sums))
+
+
+def unpack_score(payload):
+    """
+    :return: the live totals of every group
+    :rtype: list
+    """
+    return unpack_sums(payload, 0)[0]
+
+
+class TextProtocol:
+    """
+        the original protocol - the team name is '\n' terminated, every byte is a key-press and the server sends
+        formatted text
+    """
+
+    binary = False
+
+    def count_keys(self, data, size=None):
+        """
+        :param data: bytes received from the client during the game, or a buffer starting with them
+        :param size: number of bytes received at the beginning of data, all of data by default
+        :return: the number of key-presses in them, every byte is one so they aren't looked at
+        """
+        return len(data) if size is None else size
+
+    def welcome(self, rosters):
+        return welcome_text(rosters).encode()
+
+    def results(self, *result):
+        return result_text(*result).encode()
+
+    def score(self, sums):
+        """
+        :return: None - text clients take everything after the welcome as the end of the game message,
+                 so they don't get live scores
+        """
+        return None
+
+
+class BinaryProtocol:
+    """
+        length prefixed frames - the client sends the number of key-presses and renders the messages itself
+    """
+
+    binary = True
+
+    def __init__(self):
+
+        self.frames = FrameReader(MAX_CLIENT_PAYLOAD)
+
+    def count_keys(self, data, size=None):
+        """
+        :param data: bytes received from the client during the game, or a buffer starting with them
+        :param size: number of bytes received at the beginning of data, all of data by default
+        :return: the number of key-presses in the key frames they complete
+        :raises ValueError: if the client doesn't follow the protocol
+        """
+        keys = 0
+        for message_type, payload in self.frames.feed(data, size):
+            if message_type == KEYS:
+                keys += unpack_keys(payload)
+        return keys
+
+    def welcome(self, rosters):
+        return pack_welcome(rosters)
+
+    def results(self, *result):
+        return pack_results(*result)
+
+    def score(self, sums):
+        return pack_score(sums)
+
+
+TEXT_PROTOCOL = TextProtocol()  # stateless, shared by all the text clients
@@ -0,0 +1,169 @@
+import struct
+
+BURST_SECONDS = 2  # seconds of keys at the rate a team or a group may type at once
+ABUSE_FACTOR = 2  # a team is flagged once the keys it had discarded reach this many bursts
+LIMITS = struct.Struct("!dddd")  # rate and burst of a team and of a group, 0 for no limit
+
+
+class TokenBucket:
+    """
+        tokens refill at a fixed rate up to the burst, every key-press counted takes one.
+        it is refilled lazily when keys arrive, so it costs a few operations per received chunk and nothing per byte
+    """
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now):
+        """
+        :param rate: tokens added per second
+        :param burst: most tokens the bucket holds, it starts full
+        :param now: the time the bucket starts refilling at
+        """
+
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now):
+        """
+        :return: the tokens available at now
+        :rtype: float
+        """
+
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+        return self.tokens
+
+    def take(self, amount, now):
+        """
+            take up to amount tokens
+        :return: the tokens taken, less than amount once the bucket is empty
+        :rtype: int
+        """
+
+        taken = min(amount, int(self.refill(now)))
+        self.tokens -= taken
+        return taken
+
+
+class KeyLimiter:
+    """
+        caps the keys counted for every team and for every group of a game with token buckets, the keys above the
+        limits are discarded. there are no limits unless they are given, so the scoring doesn't change by default.
+        a team whose own limit discarded more than abuse_factor bursts of keys is flagged as flooding.
+        the limiter of the server is copied by every arena, the way the lobby policy is, and started with the game.
+        the times are passed in, so a recorded game replays with the same keys discarded
+    """
+
+    def __init__(self, rate=None, burst=None, group_rate=None, group_burst=None, abuse_factor=ABUSE_FACTOR):
+        """
+        :param rate: key-presses per second of a team, None for no limit
+        :param burst: key-presses a team may type at once, BURST_SECONDS of the rate by default
+        :param group_rate: key-presses per second of a whole group, None for no limit
+        :param group_burst: key-presses a group may type at once, BURST_SECONDS of the group rate by default
+        :param abuse_factor: bursts of discarded keys that flag a team as flooding
+        """
+
+        self.rate = rate
+        self.burst = burst if burst or not rate else rate * BURST_SECONDS
+        self.group_rate = group_rate
+        self.group_burst = group_burst if group_burst or not group_rate else group_rate * BURST_SECONDS
+        self.abuse_factor = abuse_factor
+        self.started = 0
+        self.group_buckets = []
+        self.discarded = 0  # keys discarded in the game, by both limits
+        self.abusive = []  # the players flagged as flooding, in the order they were flagged
+
+    def start(self, groups, now):
+        """
+            called when the game starts, every team and group starts with a full bucket
+        :param groups: number of groups in the game
+        :param now: the time the game started at
+        """
+
+        self.started = now
+        self.group_buckets = [TokenBucket(self.group_rate, self.group_burst, now)
+                              for i in range(groups)] if self.group_rate else []
+        self.discarded = 0
+        self.abusive = []
+
+    def admit(self, player, keys, now):
+        """
+            take the keys a player typed out of it's bucket and out of the bucket of it's group
+        :param player: the Player
+        :param keys: number of key-presses received
+        :param now: the time they were received at
+        :return: the key-presses to count
+        :rtype: int
+        """
+
+        allowed = keys
+        if self.rate:
+            bucket = player.bucket
+            if bucket is None:
+                bucket = player.bucket = TokenBucket(self.rate, self.burst, self.started)
+            allowed = bucket.take(keys, now)
+            if allowed < keys:
+                self.flood(player, keys - allowed)
+        if self.group_buckets:
+            counted = self.group_buckets[player.group].take(allowed, now)
+            if counted < allowed and self.rate:  # the team keeps the tokens of the keys it's group discarded
+                player.bucket.tokens += allowed - counted
+            allowed = counted
+        self.discarded += keys - allowed
+        return allowed
+
+    def throttled(self, player, now):
+        """
+        :return: if a key-press of the player arriving now would be discarded
+        :rtype: bool
+        """
+
+        if self.rate and player.bucket is not None and player.bucket.refill(now) < 1:
+            return True
+        return bool(self.group_buckets) and self.group_buckets[player.group].refill(now) < 1
+
+    def discard(self, player, keys, now):
+        """
+            account for keys read while the player was throttled, they are discarded without being admitted
+        :param player: the Player
+        :param keys: number of key-presses
+        :param now: the time they were read at
+        """
+
+        self.discarded += keys
+        if self.rate and player.bucket is not None and player.bucket.refill(now) < 1:
+            self.flood(player, keys)
+
+    def flood(self, player, keys):
+        """
+            account for keys discarded by the limit of a player, and flag it once it keeps flooding
+        :param player: the Player
+        :param keys: number of key-presses above it's limit
+        """
+
+        player.discarded += keys
+        if not player.abusive and player.discarded >= self.abuse_factor * self.burst:
+            player.abusive = True
+            self.abusive.append(player)
+            print("Team {name} is flooding, it's keys above {rate:g} per second are discarded".format(
+                name=player.name, rate=self.rate))
+
+    def pack(self):
+        """
+        :return: the limits, recorded with every round
+        :rtype: bytes
+        """
+        return LIMITS.pack(self.rate or 0, self.burst or 0, self.group_rate or 0, self.group_burst or 0)
+
+
+def unpack_limits(data, offset=0):
+    """
+    :return: the KeyLimiter of packed limits
+    :rtype: KeyLimiter
+    """
+
+    rate, burst, group_rate, group_burst = LIMITS.unpack_from(data, offset)
+    return KeyLimiter(rate or None, burst or None, group_rate or None, group_burst or None)
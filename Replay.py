@@ -0,0 +1,247 @@
+import atexit
+import collections
+import mmap
+import struct
+import threading
+import time
+from Protocol import COUNT, SUM, pack_sums
+
+# every event is a fixed header followed by it's payload - type, round, time, player number, payload length
+EVENT = struct.Struct("!BIdIH")
+REGISTRATION = struct.Struct("!HB")  # group index and if the client speaks the binary protocol, the name follows
+# event types
+PAD = 0x0  # rest of the ring before it wraps, ring files only
+ROUND = 0x1  # a lobby opened, the payload is the number of groups followed by the limits of the key limiter
+REGISTER = 0x2  # a team joined the lobby
+GAME = 0x3  # the game started
+KEYS = 0x4  # bytes received from a player during the game, as they arrived
+RESULT = 0x5  # the sums of the groups when the game ended
+DRAINED = 0x6  # the number of bytes read from a throttled text client and discarded without being kept
+
+FILE_MAGIC = b'KSBR'
+RING_MAGIC = b'KSBM'
+RING_HEADER = struct.Struct("!4sQQ")  # magic, stream offset of the oldest event and of the end of the newest one
+FLUSH_SIZE = 64 * 1024  # bytes of events buffered before they are written to the file
+MIN_RING_SIZE = 64 * 1024
+
+
+class RecordFile:
+    """
+        events appended to a file through a buffer
+    """
+
+    def __init__(self, path, flush_size=FLUSH_SIZE):
+
+        self.file = open(path, 'wb')
+        self.file.write(FILE_MAGIC)
+        self.flush_size = flush_size
+        self.buffer = bytearray()
+
+    def write(self, event):
+        self.buffer.extend(event)
+        if len(self.buffer) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.buffer.clear()
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class RingFile:
+    """
+        the latest events in a memory mapped file of a fixed size - once it is full the oldest events are overwritten.
+        positions are offsets in the stream of all the events written, the file holds the last size of them.
+        an event never wraps around the end of the file, the rest of the file is skipped instead
+    """
+
+    def __init__(self, path, size):
+        """
+        :param path: the ring file, created or overwritten
+        :param size: bytes of events the file holds
+        """
+
+        self.capacity = max(size, MIN_RING_SIZE)
+        with open(path, 'wb') as ring:
+            ring.truncate(RING_HEADER.size + self.capacity)
+        self.file = open(path, 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), RING_HEADER.size + self.capacity)
+        self.starts = collections.deque()  # stream offsets of the events in the file, oldest first
+        self.head = 0
+        self.tail = 0
+        self.update_header()
+
+    def update_header(self):
+        RING_HEADER.pack_into(self.map, 0, RING_MAGIC, self.head, self.tail)
+
+    def write(self, event):
+        offset = self.tail % self.capacity
+        if offset + len(event) > self.capacity:  # skip to the beginning of the file
+            if self.capacity - offset >= EVENT.size:
+                EVENT.pack_into(self.map, RING_HEADER.size + offset, PAD, 0, 0, 0, 0)
+            self.tail += self.capacity - offset
+            offset = 0
+
+        end = self.tail + len(event)
+        while self.starts and end - self.starts[0] > self.capacity:  # overwritten
+            self.starts.popleft()
+        self.head = self.starts[0] if self.starts else self.tail
+
+        self.map[RING_HEADER.size + offset:RING_HEADER.size + offset + len(event)] = event
+        self.starts.append(self.tail)
+        self.tail = end
+        self.update_header()
+
+    def flush(self):
+        self.map.flush()
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+
+class Recorder:
+    """
+        records the rounds played by a server - the lobby, the registrations, every arrival of keys with it's time
+        and player and the sums of the groups - in a compact binary format, to be replayed by the Simulator.
+        the rounds of concurrent arenas are told apart by their round number, players by the order they registered
+    """
+
+    def __init__(self, path, ring_size=None):
+        """
+        :param path: file the events are written to
+        :param ring_size: bytes of the memory mapped ring keeping only the latest events, None to keep them all
+        """
+
+        self.path = path
+        self.ring_size = ring_size
+        self.sink = RingFile(path, ring_size) if ring_size else RecordFile(path)
+        self.lock = threading.Lock()  # the lobby and the game may be recorded from different threads
+        self.rounds = 0
+        self.closed = False
+        atexit.register(self.close)
+
+    def write(self, event_type, round_number, player_number=0, payload=b'', timestamp=None):
+        """
+        :param timestamp: the time of the event, the current time by default
+        """
+        event = EVENT.pack(event_type, round_number, time.time() if timestamp is None else timestamp, player_number,
+                           len(payload)) + payload
+        with self.lock:
+            if not self.closed:
+                self.sink.write(event)
+
+    def open_round(self, groups, limits=b''):
+        """
+        :param groups: number of groups in the round
+        :param limits: the packed limits of the key limiter of the round
+        :return: the number of the round
+        :rtype: int
+        """
+        with self.lock:
+            self.rounds += 1
+            round_number = self.rounds
+        self.write(ROUND, round_number, 0, COUNT.pack(groups) + limits)
+        return round_number
+
+    def register(self, round_number, player):
+        payload = REGISTRATION.pack(player.group, player.protocol.binary) + player.name.encode()
+        self.write(REGISTER, round_number, player.number, payload)
+
+    def start_game(self, round_number, timestamp=None):
+        self.write(GAME, round_number, 0, b'', timestamp)
+
+    def keys(self, round_number, player, data, timestamp=None, size=None):
+        """
+        :param data: the received bytes, or a buffer starting with them
+        :param size: number of bytes received at the beginning of data, all of data by default
+        """
+        self.write(KEYS, round_number, player.number, data if size is None else memoryview(data)[:size], timestamp)
+
+    def drained(self, round_number, player, received, timestamp=None):
+        self.write(DRAINED, round_number, player.number, SUM.pack(received), timestamp)
+
+    def result(self, round_number, sums):
+        """
+            record the end of a round and write the buffered events
+        """
+        self.write(RESULT, round_number, 0, pack_sums(sums))
+        with self.lock:
+            if not self.closed:
+                self.sink.flush()
+
+    def close(self):
+        with self.lock:
+            if not self.closed:
+                self.closed = True
+                self.sink.close()
+
+
+class NullRecorder:
+    """
+        the recorder of a server that doesn't record - every event is dropped
+    """
+
+    def open_round(self, groups, limits=b''):
+        return 0
+
+    def register(self, round_number, player):
+        pass
+
+    def start_game(self, round_number, timestamp=None):
+        pass
+
+    def keys(self, round_number, player, data, timestamp=None, size=None):
+        pass
+
+    def drained(self, round_number, player, received, timestamp=None):
+        pass
+
+    def result(self, round_number, sums):
+        pass
+
+
+NO_RECORDER = NullRecorder()  # shared by all the servers that don't record
+
+
+def read_events(path):
+    """
+        read the events recorded in a record file or a ring file, oldest first
+    :return: list of (type, round, time, player number, payload)
+    :rtype: list
+    """
+
+    with open(path, 'rb') as recording:
+        data = recording.read()
+
+    events = []
+    if data.startswith(FILE_MAGIC):
+        offset = len(FILE_MAGIC)
+        while offset + EVENT.size <= len(data):
+            event_type, round_number, timestamp, player_number, length = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            events.append((event_type, round_number, timestamp, player_number, data[offset:offset + length]))
+            offset += length
+        return events
+
+    magic, head, tail = RING_HEADER.unpack_from(data)
+    if magic != RING_MAGIC:
+        raise ValueError("{} isn't a recording".format(path))
+    ring = memoryview(data)[RING_HEADER.size:]
+    capacity = len(ring)
+    position = head
+    while position < tail:
+        offset = position % capacity
+        if capacity - offset < EVENT.size or ring[offset] == PAD:
+            position += capacity - offset
+            continue
+        event_type, round_number, timestamp, player_number, length = EVENT.unpack_from(ring, offset)
+        events.append((event_type, round_number, timestamp, player_number,
+                       bytes(ring[offset + EVENT.size:offset + EVENT.size + length])))
+        position += EVENT.size + length
+    return events
@@ -0,0 +1,53 @@
+import time
+
+SNAPSHOT_INTERVAL = 0.5  # minimal seconds between two live score snapshots sent to the clients
+
+
+class Scoreboard:
+    """
+        running totals of the keys typed by every group, updated as the keys arrive so the result of the game is
+        read without going over the players again. it is only updated from the loop collecting the keys of it's arena
+    """
+
+    def __init__(self, groups=2, interval=SNAPSHOT_INTERVAL):
+        """
+        :param groups: number of groups in the game
+        :param interval: minimal seconds between two snapshots
+        """
+
+        self.totals = [0] * groups
+        self.interval = interval
+        self.changed = False  # keys arrived since the last snapshot
+        self.last_snapshot = 0
+
+    def add(self, group_number, keys):
+        """
+            count keys typed by a team of a group
+        :param group_number: index of the group, 0 for group 1
+        :param keys: number of key-presses
+        """
+
+        if keys:
+            self.totals[group_number] += keys
+            self.changed = True
+
+    def time_until_snapshot(self):
+        """
+        :return: seconds until the next snapshot may be taken
+        :rtype: float
+        """
+
+        return self.last_snapshot + self.interval - time.time()
+
+    def snapshot(self):
+        """
+            take a snapshot of the totals, all the keys that arrived since the previous snapshot are coalesced into it
+        :return: the totals of the groups, None if nothing changed or the previous snapshot is too recent
+        :rtype: tuple
+        """
+
+        if not self.changed or self.time_until_snapshot() > 0:
+            return None
+        self.changed = False
+        self.last_snapshot = time.time()
+        return tuple(self.totals)
@@ -1,35 +1,521 @@
+import copy
 import socket
 import time
-import struct
 import threading
 from scapy.arch import get_if_addr
-
+from KeyCollector import KeyCollector
+from FanOut import FanOut
+from AcceptLoop import AcceptLoop, BACKLOG
+from LobbyPolicy import FixedWindowPolicy
+from Scoreboard import Scoreboard
+from Metrics import Metrics, MetricsEndpoint, NO_METRICS, RATE_BUCKETS
+from Replay import NO_RECORDER
+from RateLimiter import KeyLimiter
+from Protocol import FrameReader, BinaryProtocol, TEXT_PROTOCOL, REGISTER, PROTOCOL_VERSION, MAX_CLIENT_PAYLOAD, \
+    is_binary, unpack_register, pack_offer, result_text
+
+INTERFACE = 'eth1'  # default network interface the server listens on
 TIMEOUT = 10
 BUFFER_SIZE = 2048
-# constants for group play indexes:
-GROUP_NAME_INDEX = 0
-CONNECTION_SOCKET_INDEX = 1
-CLIENT_ADDRESS_INDEX = 2
-KEY_COUNTER_INDEX = 3
+DRAIN_SIZE = 64 * 1024  # bytes read at once from a text client whose keys are discarded anyway
+MAX_NAME_LENGTH = 64  # maximal length in bytes of a team name, without the '\n' delimiter
+OFFER_INTERVAL = 1  # seconds between udp offers
+FILLING_OFFER_INTERVAL = 0.25  # seconds between udp offers once teams started joining the lobby
+LOBBY_POLL_INTERVAL = 0.1  # maximal seconds a lobby thread blocks before checking if the lobby closed
+GROUPS = 2  # default number of groups the teams are split into
+
+
+class TeamNameReader:
+    """
+        incremental reader of the team name sent by a client when it connects - either '\n' terminated text,
+        or a register frame of the binary protocol
+    """
+
+    def __init__(self, max_length=MAX_NAME_LENGTH):
+
+        self.max_length = max_length
+        self.buffer = bytearray()
+        self.protocol = TEXT_PROTOCOL  # the protocol the client speaks, known once the name is complete
+
+    def feed(self, data, size=None):
+        """
+            add received bytes to the name
+        :param data: bytes received from the client, or a buffer starting with them
+        :param size: number of bytes received at the beginning of data, all of data by default
+        :return: the team name once the '\n' delimiter or the register frame arrived, None while it is incomplete
+        :rtype: str
+        :raises ValueError: if the name is longer than max_length or isn't valid utf-8
+        """
+
+        self.buffer.extend(data if size is None else memoryview(data)[:size])
+        if is_binary(self.buffer):
+            return self.feed_frame()
+
+        end = self.buffer.find(b'\n')
+        if end == -1:
+            if len(self.buffer) > self.max_length:
+                raise ValueError("team name is longer than {} bytes".format(self.max_length))
+            return None
+
+        if end > self.max_length:
+            raise ValueError("team name is longer than {} bytes".format(self.max_length))
+        return self.buffer[:end].decode()
+
+    def feed_frame(self):
+        """
+            read the register frame of a binary protocol client from the buffer
+        :return: the team name once the frame is complete
+        :raises ValueError: if the frame isn't a register frame, the version is unknown or the name is too long
+        """
+
+        frames = FrameReader(MAX_CLIENT_PAYLOAD).feed(self.buffer)
+        if not frames:
+            return None
+
+        message_type, payload = frames[0]
+        if message_type != REGISTER or len(frames) > 1:
+            raise ValueError("expected a single register frame")
+        version, group_name = unpack_register(payload)
+        if version != PROTOCOL_VERSION:
+            raise ValueError("unknown protocol version {}".format(version))
+        if len(group_name.encode()) > self.max_length:
+            raise ValueError("team name is longer than {} bytes".format(self.max_length))
+        self.protocol = BinaryProtocol()
+        return group_name
+
+
+class Player:
+    """
+        a registered team - it's connection, the protocol it speaks, it's group, the keys it typed and how it stands
+        with the key limiter. the slots keep the record small when tens of thousands of teams register
+    """
+
+    __slots__ = ('name', 'connection', 'address', 'protocol', 'group', 'number', 'keys', 'bucket', 'discarded',
+                 'abusive')
+
+    def __init__(self, name, connection, address, protocol=TEXT_PROTOCOL, group=0, number=0):
+        """
+        :param name: the name of the team
+        :param connection: the connection of the client
+        :param address: (client ip, port)
+        :param protocol: the protocol the client speaks, TEXT_PROTOCOL or a BinaryProtocol
+        :param group: index of the group of the team, 0 for group 1
+        :param number: the order the team registered in, identifies it in recordings
+        """
+
+        self.name = name
+        self.connection = connection
+        self.address = address
+        self.protocol = protocol
+        self.group = group
+        self.number = number
+        self.keys = 0  # the keys typed in the game
+        self.bucket = None  # the TokenBucket of the team, created by the key limiter when it's first keys arrive
+        self.discarded = 0  # the keys typed above it's limit
+        self.abusive = False  # if the key limiter flagged the team as flooding
+
+
+class Arena:
+    """
+        the state of a single game - the lobby, the groups of the teams and the game clock.
+        the all time records are kept by the server that owns the arena
+    """
+
+    def __init__(self, server, lobby_policy, lobby_closed=None, groups=GROUPS):
+        """
+        :param server: the server owning the all time records
+        :param lobby_policy: decides when the lobby closes, copied so every arena keeps it's own state
+        :param lobby_closed: event set when the lobby closes, a threading.Event by default
+        :param groups: number of groups the teams are split into
+        """
+
+        self.server = server
+        self.groups = [[] for i in range(groups)]  # the players of every group
+        self.registered = []  # the players of all the groups, in the order they registered
+        self.group_number = 0  # the group the next registered team is assigned to
+
+        # decides when the lobby closes, broadcasting and accepting stop together once it does
+        self.lobby_policy = copy.copy(lobby_policy)
+        self.lobby_policy.reset()
+        self.lobby_closed = lobby_closed if lobby_closed else threading.Event()
+        self.lobby_lock = threading.Lock()
+        self.encoded = {}  # messages already encoded, by (kind, binary protocol)
+        self.scoreboard = Scoreboard(groups)  # totals of the groups, updated as the keys arrive
+        self.unsent = {}  # the rest of live score snapshots clients didn't read yet, by connection socket
+        # added up during the game and reported to the metrics of the server once it ends
+        self.recv_calls = 0
+        self.received_bytes = 0
+        self.drained_bytes = 0  # read from text clients over their limit, without being looked at
+        # caps the keys counted, copied so every arena keeps it's own buckets
+        self.limiter = copy.copy(server.key_limiter)
+        # every read of the game, and of what the clients sent in the lobby, goes into this buffer
+        self.receive_buffer = bytearray(DRAIN_SIZE)
+        self.receive_view = memoryview(self.receive_buffer)
+        # identifies the round in the recording
+        self.round_number = server.recorder.open_round(groups, self.limiter.pack())
+
+        # variable used to count total time passed since the beginning of the lobby, then of the game
+        self.begin = time.time()
+
+    def players(self):
+        """
+        :return: the players of all the groups
+        :rtype: list
+        """
+        return self.registered
+
+    def register_player(self, group_name, connection, client_address, protocol=TEXT_PROTOCOL):
+        """
+            add a client that sent it's team name to the next group, the groups take turns
+        :param group_name: the name of the team
+        :param connection: the connection of the client
+        :param client_address: (client ip, port)
+        :param protocol: the protocol the client speaks, TEXT_PROTOCOL or a BinaryProtocol
+        :return: if the client was registered, False if the lobby is already closed or full
+        :rtype: bool
+        """
+
+        with self.lobby_lock:
+            if self.lobby_closed.is_set() or self.lobby_policy.is_full(len(self.registered)):
+                print("Team {name} arrived after the lobby closed".format(name=group_name))
+                return False
+
+            group_number = self.group_number
+            player = Player(group_name, connection, client_address, protocol, group_number, len(self.registered))
+            self.groups[group_number].append(player)
+            self.registered.append(player)
+            self.server.recorder.register(self.round_number, player)
+            self.group_number = (group_number + 1) % len(self.groups)
+        print("Team {name} joined group {number}".format(name=group_name, number=group_number + 1))
+
+        self.update_lobby()
+        return True
+
+    def lobby_time_left(self):
+        """
+        :return: seconds left until the lobby policy starts the game
+        :rtype: float
+        """
+
+        with self.lobby_lock:
+            return self.lobby_policy.time_left(len(self.registered), time.time() - self.begin)
+
+    def update_lobby(self):
+        """
+            close the lobby once the lobby policy is satisfied
+        :return: if the lobby is closed
+        :rtype: bool
+        """
+
+        if self.lobby_time_left() <= 0:
+            self.lobby_closed.set()
+        return self.lobby_closed.is_set()
+
+    def load(self):
+        """
+        :return: (capacity, players) of the lobby as announced in the offers, capacity is None for no limit
+        :rtype: tuple
+        """
+
+        with self.lobby_lock:
+            return self.lobby_policy.max_players, len(self.registered)
+
+    def offer_interval(self):
+        """
+        :return: seconds until the next offer - offers are sent faster once teams started joining so the lobby fills
+                 up quickly, and stop while it is full or closed. None for no offer
+        :rtype: float
+        """
+
+        capacity, players = self.load()
+        if self.lobby_closed.is_set() or (capacity is not None and players >= capacity):
+            return None
+        return FILLING_OFFER_INTERVAL if players else OFFER_INTERVAL
+
+    def send_welcome(self):
+        """
+            send the welcoming message to each group
+        """
+
+        self.discard_lobby_bytes()
+        rosters = self.rosters()
+        start = time.time()
+
+        # clients too slow to read the welcome are dropped, the game doesn't wait for them
+        dropped = FanOut().send((player.connection, self.encode_message(player, 'welcome', rosters))
+                                for player in self.players())
+        self.server.metrics.observe('welcome_fanout_seconds', time.time() - start)
+        self.server.metrics.increment('fanout_dropped_total', dropped)
+
+    def discard_lobby_bytes(self):
+        """
+            read and discard what the clients sent since they registered, keys count from the welcome on.
+            they are read right before it is sent, so the lobby doesn't have to read every client
+        """
+
+        for player in self.players():
+            sock = player.connection
+            try:
+                timeout = sock.gettimeout()
+                sock.setblocking(False)
+            except OSError:  # socket already closed
+                continue
+            try:
+                while True:
+                    received = sock.recv_into(self.receive_buffer)
+                    if not received:  # client closed the connection, the game finds out
+                        break
+                    self.drain(player, received, time.time())
+            except socket.error:  # nothing left to read, or the client failed
+                pass
+            try:
+                sock.settimeout(timeout)
+            except OSError:
+                pass
+
+    def game_mode(self):
+        """
+            this function collects the keys of the players in all the groups until the game is over
+            then calculate the winner and print and send appropriate end of the game messages to each client
+        """
+
+        self.start_game()
+
+        # collect the keys of every player from a single selector loop until the game is over
+        connections = [(player.connection, player) for player in self.players()]
+        KeyCollector(self.receive_keys).collect(connections, self.begin + TIMEOUT, self.publish_scores,
+                                                self.scoreboard.interval)
+        self.report_ingestion(time.time() - self.begin)
+
+        result = self.result()
+        print(result_text(*result))
+
+        start = time.time()
+        deliveries = []
+        for player in self.players():
+            message = self.encode_message(player, 'results', *result)
+            unsent = self.unsent.pop(player.connection, None)
+            deliveries.append((player.connection, unsent + message if unsent else message))  # finish the snapshot
+        # written to all the clients at once, a slow client delays only itself
+        dropped = FanOut(close=True).send(deliveries)
+        self.server.metrics.observe('result_fanout_seconds', time.time() - start)
+        self.server.metrics.increment('fanout_dropped_total', dropped)
+
+    def start_game(self, now=None):
+        """
+            start the game clock and the key limiter
+        :param now: the time the game starts at, the current time by default
+        """
+
+        self.begin = time.time() if now is None else now
+        self.limiter.start(len(self.groups), self.begin)
+        self.server.recorder.start_game(self.round_number, self.begin)
+
+    def report_ingestion(self, duration):
+        """
+            report the keys collected in the game to the metrics of the server
+        :param duration: seconds the keys were collected
+        """
+
+        metrics = self.server.metrics
+        metrics.increment('games_total')
+        metrics.observe('game_seconds', duration)
+        metrics.increment('recv_calls_total', self.recv_calls)
+        metrics.increment('received_bytes_total', self.received_bytes)
+        metrics.increment('drained_bytes_total', self.drained_bytes)
+        metrics.increment('keys_total', sum(self.scoreboard.totals))
+        metrics.increment('discarded_keys_total', self.limiter.discarded)
+        metrics.increment('abusive_players_total', len(self.limiter.abusive))
+        for player in self.players():
+            metrics.observe('player_keys_per_second', player.keys / duration if duration > 0 else 0, RATE_BUCKETS)
+
+    def rosters(self):
+        """
+        :return: the names of the teams of every group
+        :rtype: list
+        """
+
+        return [[player.name for player in group] for group in self.groups]
+
+    def encode_message(self, player, kind, *args):
+        """
+            encode a message in the protocol of the player, every protocol encodes it once per arena
+        :param player: the player the message is sent to
+        :param kind: 'welcome' or 'results', the method of the protocol encoding the message
+        :param args: the arguments of the message
+        :rtype: bytes
+        """
+
+        key = (kind, player.protocol.binary)
+        if key not in self.encoded:
+            self.encoded[key] = getattr(player.protocol, kind)(*args)
+        return self.encoded[key]
+
+    def result(self):
+        """
+            read the sums of the groups off the scoreboard and update the all time records
+        :return: the sums of the groups, the names of their teams, the maximum score, the minimum score and
+                 the names of the best teams ever
+        :rtype: tuple
+        """
+
+        sums = list(self.scoreboard.totals)
+        rosters = self.rosters()
+        keys = [[player.keys for player in group] for group in self.groups]
+        max_score, min_score, best_team_ever = self.server.update_records(sums, rosters, keys)
+        self.server.recorder.result(self.round_number, sums)
+        return sums, rosters, max_score, min_score, best_team_ever
+
+    def receive_keys(self, player):
+        """
+            this function receives the keys sent by a client whose socket is readable and counts them.
+            the bytes are read into the buffer of the arena, so counting the keys of a text client doesn't allocate
+            anything. a text client over it's limit is drained in bigger reads, every byte it sends is a discarded
+            key-press so there is nothing to look at
+            :param player - the Player whose connection is readable
+            :return: False once the client closed the connection or it failed, True otherwise
+        """
+
+        now = time.time()
+        throttled = not player.protocol.binary and self.limiter.throttled(player, now)
+        try:
+            received = player.connection.recv_into(self.receive_buffer, DRAIN_SIZE if throttled else BUFFER_SIZE)
+        except BlockingIOError:  # nothing to read after all
+            return True
+        except socket.error:
+            return False
+
+        if not received:  # client closed the connection
+            return False
+        if throttled:
+            self.drain(player, received, now)
+            return True
+        return self.ingest(player, self.receive_view, now, received)
+
+    def ingest(self, player, data, now=None, size=None):
+        """
+            count the keys in bytes received from a player during the game, up to the limits of the key limiter
+        :param player: the Player
+        :param data: the received bytes, or a buffer starting with them
+        :param now: the time they were received at, the current time by default
+        :param size: number of bytes received at the beginning of data, all of data by default
+        :return: False if the client broke the binary protocol, True otherwise
+        :rtype: bool
+        """
+
+        if now is None:
+            now = time.time()
+        if size is None:
+            size = len(data)
+        self.server.recorder.keys(self.round_number, player, data, now, size)
+        self.recv_calls += 1
+        self.received_bytes += size
+        try:
+            keys = player.protocol.count_keys(data, size)
+        except ValueError:
+            return False
+        self.count_keys(player, self.limiter.admit(player, keys, now))
+        return True
+
+    def drain(self, player, received, now):
+        """
+            discard bytes a text client sent over it's limit, or any client sent before the game, they were read
+            without being kept
+        :param player: the Player
+        :param received: number of bytes read
+        :param now: the time they were read at
+        """
+
+        self.server.recorder.drained(self.round_number, player, received, now)
+        self.recv_calls += 1
+        self.received_bytes += received
+        self.drained_bytes += received
+        self.limiter.discard(player, received, now)
+
+    def count_keys(self, player, keys):
+        """
+            add keys typed by a player to it's counter and to the total of it's group
+        :param player: the Player
+        :param keys: number of key-presses
+        """
+
+        player.keys += keys
+        self.scoreboard.add(player.group, keys)
+
+    def score_messages(self):
+        """
+            take a snapshot of the scoreboard and encode it once per protocol
+        :return: list of (player, encoded snapshot) for the players getting live scores,
+                 empty if nothing changed since the last snapshot
+        :rtype: list
+        """
+
+        totals = self.scoreboard.snapshot()
+        if totals is None:
+            return []
+
+        encoded = {}
+        messages = []
+        for player in self.players():
+            protocol = player.protocol
+            if protocol.binary not in encoded:
+                encoded[protocol.binary] = protocol.score(totals)
+            if encoded[protocol.binary]:
+                messages.append((player, encoded[protocol.binary]))
+        return messages
+
+    def publish_scores(self):
+        """
+            send a live score snapshot to the players without blocking the collection of the keys.
+            a client that didn't read the previous snapshot yet skips this one
+        """
+
+        for player, message in self.score_messages():
+            conn = player.connection
+            unsent = self.unsent.pop(conn, b'')
+            if unsent:  # finish the frame the client is in the middle of instead
+                message = unsent
+            try:
+                sent = conn.send(message)
+            except BlockingIOError:
+                sent = 0
+            except socket.error:
+                continue
+            # a frame has to be completed once it's first byte was sent
+            if sent < len(message) and (unsent or sent):
+                self.unsent[conn] = message[sent:]
 
 
 class Server:
 
-    def __init__(self, name):
+    def __init__(self, name, lobby_policy=None, interface=INTERFACE):
 
         self.name = name
+        self.interface = interface
         self.port_number = 2049
-        self.server_ip = get_if_addr('eth1')
+        self.server_ip = get_if_addr(interface)
         self.udp_port = 13117
         self.server_socket = None
-        self.group1 = []  # contains list of - group_name, connection_socket, client_address, key_counter
-        self.group2 = []
-        self.min_score = 0
+        self.min_score = None  # the lowest sum of a losing group, None until a game was played
         self.max_score = 0
-        self.best_team_ever = []
-
-        # variable used to count total time passed since the beginning of the game
-        self.begin = None
+        self.best_team_ever = []  # the names of the teams in the group with the maximum score
+        self.records_lock = threading.Lock()  # arenas may finish at the same time
+        self.groups = GROUPS  # number of groups in every game
+        self.backlog = BACKLOG  # connections the kernel queues until they are accepted
+        self.announce_load = False  # send the load of the lobby after the offer, older clients ignore such offers
+        self.leaderboard = None  # optional persistent store of all the games, see use_leaderboard
+        self.metrics = NO_METRICS  # see use_metrics
+        self.profiler = None  # optional RoundProfiler of every game
+        self.recorder = NO_RECORDER  # see use_recorder
+        self.key_limiter = KeyLimiter()  # caps the keys counted for every team and group if given limits
+
+        # decides when the lobby of every arena closes
+        self.lobby_policy = lobby_policy if lobby_policy else FixedWindowPolicy()
+        # the game currently in the lobby or being played
+        self.arena = None
+        self.arena_lock = threading.RLock()  # the accept loop registers clients while the next arena opens
+        # clients that sent their team name while no lobby was open, as join_lobby arguments. they join the next one
+        self.queued = []
 
     def start_server(self):
         """
@@ -39,35 +525,55 @@ class Server:
                         print the winner message
         """
         print("Server started, listening on {IP} address".format(IP=self.server_ip))
+        self.listen()
         while True:
             self.waiting_for_clients()
-            if self.server_socket:
-                print("Entering game mode")
-                self.game_mode(self.server_socket)
+            print("Entering game mode")
+            self.game_mode()
             print("Game over, sending out offer requests...")
 
+    def listen(self):
+        """
+            create the listening socket, kept open for all the rounds, and accept tcp connections for good on a
+            thread of their own - clients arriving during a game are queued for the next one instead of refused
+        """
+
+        try:
+            self.server_socket = self.create_server_socket()
+        except socket.error as error:
+            print("failed to listen on port {port}: {error}".format(port=self.port_number, error=error))
+            raise
+        threading.Thread(target=self.accept_tcp, args=(), daemon=True).start()
+
     def waiting_for_clients(self):
         """
-            this function simultaneously sends udp broadcasts offers and accept tcp messages
+            this function opens a new lobby, with the clients queued during the previous game, and sends udp
+            broadcasts offers until the lobby policy starts the game. then it sends welcoming message to each group
         """
 
+        arena = Arena(self, self.lobby_policy, groups=self.groups)
+        start = time.time()
+        with self.arena_lock:
+            self.arena = arena
+            self.join_queued()
+
         # broadcasting with UDP
         udp_thread = threading.Thread(target=self.broadcast_offer, args=())
         udp_thread.start()
 
-        # receiving tcp connection
-        tcp_thread = threading.Thread(target=self.accept_tcp, args=())
-        tcp_thread.start()
+        # the accept loop registers the clients, time based rules are checked here
+        while not arena.update_lobby():
+            arena.lobby_closed.wait(LOBBY_POLL_INTERVAL)
 
         udp_thread.join()
-        tcp_thread.join()
+        self.metrics.observe('lobby_seconds', time.time() - start)
+        arena.send_welcome()
 
     def broadcast_offer(self):
         """
-            broadcast udp offers every second for 10 seconds
+            broadcast udp offers announcing the load of the lobby until it closes, see Arena.offer_interval
         """
 
-        self.begin = time.time()
         broadcast_ip = '<broadcast>'
         try:
             sock = socket.socket(socket.AF_INET,  # Internet
@@ -77,223 +583,202 @@ class Server:
             return
 
         if sock:
-            magic_cookie = 0xfeedbeef
-            message_type = 0x2
-
-            message = struct.pack("Ibh", magic_cookie, message_type, self.port_number)
+            arena = self.arena
+            lobby_closed = arena.lobby_closed
 
-            i = 0
-            while i < TIMEOUT:
-                sock.sendto(message, (broadcast_ip, self.udp_port))
-                time.sleep(1)  # putting the current thread to sleep
-                i += 1
+            while not lobby_closed.is_set():
+                interval = arena.offer_interval()
+                if interval is not None:
+                    sock.sendto(self.offer_message(arena), (broadcast_ip, self.udp_port))
+                    self.metrics.increment('offers_sent_total')
+                # sleep until the next offer or until the lobby closes
+                lobby_closed.wait(interval if interval is not None else LOBBY_POLL_INTERVAL)
 
             sock.close()
 
     def accept_tcp(self):
         """
-            accept tcp offers and open a separate thread for every client to start playing the game
-            then send welcoming message to each group
+            accept tcp connections and read the team names for good from a single loop
+        """
+        AcceptLoop(self.server_socket, self.join_lobby, TeamNameReader, self.lobby_policy.window,
+                   self.metrics).run(lambda: False, LOBBY_POLL_INTERVAL)
+
+    def join_lobby(self, group_name, protocol, connection_socket, client_address, start):
+        """
+            assign a client that sent it's team name to a group of the arena in the lobby, or queue it for the next
+            lobby if the lobby is closed or full
+        :param group_name: the name of the team
+        :param protocol: the protocol the client speaks
+        :param connection_socket: the connection of the client
+        :param client_address: (client ip, port)
+        :param start: when the connection of the client was accepted
+        """
+
+        with self.arena_lock:
+            if self.arena is not None and self.arena.register_player(group_name, connection_socket, client_address,
+                                                                     protocol):
+                self.registered(start)
+                return
+            self.queued.append((group_name, protocol, connection_socket, client_address, start))
+        print("Team {name} is queued for the next game".format(name=group_name))
+        self.metrics.increment('queued_registrations_total')
+
+    def join_queued(self):
+        """
+            move the teams queued during the previous game into the lobby of the current arena. teams that closed
+            their connection while they waited are dropped, so they don't play a game of their own
+        """
+
+        with self.arena_lock:
+            queued, self.queued = self.queued, []
+            for group_name, protocol, connection, client_address, start in queued:
+                if self.connection_closed(connection):
+                    print("Team {name} left the queue".format(name=group_name))
+                    self.close_connection(connection)
+                    self.metrics.increment('abandoned_registrations_total')
+                    continue
+                self.join_lobby(group_name, protocol, connection, client_address, start)
+
+    def connection_closed(self, connection):
+        """
+            check without blocking if a queued client closed it's connection. what it typed while it waited stays
+            buffered for the lobby to discard
+        :param connection: the connection of the client
+        :return: if the client closed the connection or it was reset
+        :rtype: bool
         """
+
+        timeout = connection.gettimeout()
+        connection.setblocking(False)
         try:
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            return not connection.recv(1, socket.MSG_PEEK)
+        except BlockingIOError:  # nothing buffered, the connection is still open
+            return False
         except socket.error:
-            return
-        self.server_socket.bind((self.server_ip, self.port_number))
-        self.server_socket.listen(5)
-
-        group_number = 0
-        elapsed = 0
-        threads = []
-        while elapsed < TIMEOUT:  # while elapsed time is under 10 seconds keep assigning to groups
+            return True
+        finally:
+            connection.settimeout(timeout)
 
-            self.server_socket.settimeout(TIMEOUT)
-            try:
-                connection_socket, address = self.server_socket.accept()
-            except socket.error:
-                elapsed = time.time() - self.begin
-                continue
+    def close_connection(self, connection):
+        connection.close()
 
-            connection_thread = threading.Thread(target=self.connect_to_client,
-                                                 args=(connection_socket, address, group_number,))
-            connection_thread.start()
-            threads.insert(0, connection_thread)
-            group_number = (group_number + 1) % 2
+    def registered(self, start):
+        """
+            report a registration to the metrics
+        :param start: when the connection of the client was accepted
+        """
 
-            elapsed = time.time() - self.begin
+        self.metrics.increment('registrations_total')
+        self.metrics.observe('registration_seconds', time.time() - start)
 
-        for t in threads:
-            t.join()
+    def game_mode(self):
+        """
+            play the game of the current arena, the listening socket stays open for the next one
+        """
 
-        welcoming_message = "Welcome to Keyboard Spamming Battle Royale.\nGroup 1:\n==\n"
-        for i in range(len(self.group1)):
-            welcoming_message += self.group1[i][0] + "\n"  # add the name of each group
-        welcoming_message += "\nGroup 2:\n==\n"
-        for i in range(len(self.group2)):
-            welcoming_message += self.group2[i][0] + "\n"  # add the name of each group
-        welcoming_message += "\nStart pressing keys on your keyboard as fast as you can!!\n"
+        if len(self.arena.players()) == 0:
+            print("no players connected")
+            return
 
-        for player in self.group1:
-            try:
-                conn = player[CONNECTION_SOCKET_INDEX]
-                conn.sendall(welcoming_message.encode())
-            except socket.error:
-                pass
-        for player in self.group2:
-            try:
-                conn = player[CONNECTION_SOCKET_INDEX]
-                conn.sendall(welcoming_message.encode())
-            except socket.error:
-                pass
+        self.play_round(self.arena)
 
-    def connect_to_client(self, connection_socket, client_address, group_number):
+    def play_round(self, arena):
         """
-            this function receives the socket of the tcp connection and waits for the group to send it's name
-            assign every client to a group
-        :param connection_socket: the tcp socket between sever and each client
-        :param client_address: (client ip, port)
-        :param group_number: the number of the group client is assigned to
+            play the game of an arena, under the profiler if there is one
+        :param arena: the arena whose lobby closed
         """
 
-        # receive the name of the team
-        total_data = []
-        while True:
-            timeout = TIMEOUT - (time.time() - self.begin)
-            if timeout < 0:
-                break
-            connection_socket.settimeout(timeout)
-            try:
-                data = connection_socket.recv(BUFFER_SIZE)
-                if data:
-                    total_data.append(data.decode())
-            except socket.error:
-                break
+        if self.profiler:
+            self.profiler.profile(arena.game_mode)
+        else:
+            arena.game_mode()
 
-        # join all parts to make final string
-        group_name = ''.join(total_data)  # receive the name of the group from tcp client
+    def use_metrics(self, metrics_port=None, profiler=None):
+        """
+            instrument the server - count offers, accepts and registrations, time the lobby, the game and the
+            fan-out of the messages, and measure the ingestion of the keys
+        :param metrics_port: local port of the http endpoint serving the metrics, None for no endpoint
+        :param profiler: optional RoundProfiler dumping the profile of every game
+        """
 
-        if group_number == 0 and len(group_name) > 0 and group_name[-1:] == '\n':
-            self.group1.insert(0, [group_name[:-1], connection_socket, client_address, 0])
+        self.metrics = Metrics()
+        self.profiler = profiler
+        if metrics_port is not None:
+            MetricsEndpoint(self.metrics, metrics_port).start()
+            print("Serving metrics on http://127.0.0.1:{port}/metrics".format(port=metrics_port))
 
-        elif group_number == 1 and len(group_name) > 0 and group_name[-1:] == '\n':
-            self.group2.insert(0, [group_name[:-1], connection_socket, client_address, 0])
+    def use_recorder(self, recorder):
+        """
+            record every round - the registrations and every arrival of keys - to be replayed by the Simulator
+        :param recorder: the Recorder
+        """
 
-        else:
-            # the name received isn't correct
-            print("the group name received isn't correct" + group_name)
-            connection_socket.close()
+        self.recorder = recorder
 
-    def game_mode(self, server_socket):
+    def use_leaderboard(self, leaderboard):
         """
-            this function creates threads for players in both groups to collect keys from
-            then calculate the winner and print and send appropriate end of the game messages to each client
-        :return:
-        :rtype:
+            record every game in a persistent leaderboard and continue the all time records kept in it
+        :param leaderboard: the Leaderboard
         """
 
-        if len(self.group1) == 0 and len(self.group2) == 0:
-            print("no players connected")
-            self.server_socket.close()
-            return
-        self.begin = time.time()
-        threads = []
-        elapsed = 0
-        while elapsed < TIMEOUT:
-
-            for player in self.group1:
-                connection_thread = threading.Thread(target=self.receive_keys, args=(player,))
-                connection_thread.start()
-                threads.insert(0, connection_thread)
-
-            for player in self.group2:
-                connection_thread = threading.Thread(target=self.receive_keys, args=(player,))
-                connection_thread.start()
-                threads.insert(0, connection_thread)
-
-            elapsed = time.time() - self.begin
-
-        sum_group1 = 0
-        sum_group2 = 0
-        # after the while we should close the connection of each player
-        for player in self.group1:
-            sum_group1 += player[KEY_COUNTER_INDEX]
-        for player in self.group2:
-            sum_group2 += player[KEY_COUNTER_INDEX]
-        for t in threads:
-            t.join()
-
-        if sum_group1 > sum_group2:
-            message = "\nGame over!\nGroup 1 typed in {sum1} characters. Group 2 typed in {sum2} " \
-                      "characters.\nGroup 1 wins!\n\nCongratulations to the winners:\n==".format(sum1=sum_group1,
-                                                                                                 sum2=sum_group2)
-            for player in self.group1:
-                message += "\n" + player[GROUP_NAME_INDEX]
-            if self.max_score < sum_group1:
-                self.max_score = sum_group1
-                self.best_team_ever = self.group1
-            if self.min_score > sum_group2:
-                self.max_score = sum_group2
-        elif sum_group2 > sum_group1:
-            message = "\nGame over!\nGroup 1 typed in {sum1} characters. Group 2 typed in {sum2} " \
-                      "characters.\nGroup 2 wins!\n\nCongratulations to the winners:\n==".format(sum1=sum_group1,
-                                                                                                 sum2=sum_group2)
-            for player in self.group2:
-                message += "\n" + player[GROUP_NAME_INDEX]
-            if self.max_score < sum_group2:
-                self.max_score = sum_group2
-                self.best_team_ever = self.group2
-            if self.min_score > sum_group1:
-                self.min_score = sum_group1
-        else:
-            message = "\nGame over!\nGroup 1 and Group 2 typed in {} characters. It's a draw! ".format(sum_group1)
-            if self.max_score < sum_group1:
-                self.max_score = sum_group1
-                self.best_team_ever = self.group1
-            if self.min_score > sum_group1:
-                self.min_score = sum_group1
-        message += "\nThe maximum score ever was: {max}\nThe minimum score ever was: {min}\n".format(max=self.max_score,
-                                                                                                 min=self.min_score)
-        message += "\nThe best teams to play the game are:\n=="
-        for player in self.best_team_ever:
-            message += "\n" + player[GROUP_NAME_INDEX]
-        print(message)
-
-        for player in self.group1:
-            try:
-                player[CONNECTION_SOCKET_INDEX].sendall(message.encode())
-                player[CONNECTION_SOCKET_INDEX].close()
-            except:
-                pass
-        for player in self.group2:
-            try:
-                player[CONNECTION_SOCKET_INDEX].sendall(message.encode())
-                player[CONNECTION_SOCKET_INDEX].close()
+        self.leaderboard = leaderboard
+        max_score, best_team_ever = leaderboard.best_teams()
+        min_score = leaderboard.records()[1]
+        with self.records_lock:
+            if self.max_score < max_score:
+                self.max_score = max_score
+                self.best_team_ever = best_team_ever
+            if min_score is not None and (self.min_score is None or self.min_score > min_score):
+                self.min_score = min_score
+
+    def update_records(self, sums, rosters, keys=None):
+        """
+            update the all time records with the result of a game. on a draw the first of the tied groups counts
+            as the winner
+        :param sums: the number of keys typed by every group
+        :param rosters: the names of the teams of every group
+        :param keys: the number of keys typed by every team of every group, for the leaderboard
+        :return: the maximum score, the minimum score and the names of the best teams ever
+        :rtype: tuple
+        """
 
-            except:
-                pass
+        winner_sum = max(sums)
+        loser_sum = min(sums)
+        winners = rosters[sums.index(winner_sum)]
 
-        server_socket.close()
+        with self.records_lock:
+            if self.max_score < winner_sum:
+                self.max_score = winner_sum
+                self.best_team_ever = winners
+            if self.min_score is None or self.min_score > loser_sum:
+                self.min_score = loser_sum
+            records = self.max_score, self.min_score, self.best_team_ever
 
-    def receive_keys(self, player):
+        if self.leaderboard:  # written in the background, the end of the game message doesn't wait for it
+            self.leaderboard.record_game(sums, rosters, keys)
+        return records
+
+    def create_server_socket(self):
         """
-            this function receives the keys sent by each client and counts them
-            :param player - tuple of group_name, connection_socket, client_address, key_counter
+            create the listening tcp socket of the server
+        :return: the bound and listening socket
+        :rtype: socket.socket
         """
-        connection_socket = player[CONNECTION_SOCKET_INDEX]
-        key_counter = player[CLIENT_ADDRESS_INDEX]
 
-        while True:
-            timeout = TIMEOUT - (time.time() - self.begin)
-            if timeout <= 0:
-                break
-            # receive keys
-            try:
-                connection_socket.settimeout(timeout)
-                data = connection_socket.recv(BUFFER_SIZE)
-                if data:
-                    key_counter += len(data)  # len of bytes returns how many bytes are in the
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # the port is bound again right away after a restart, despite the connections in TIME_WAIT
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server_socket.bind((self.server_ip, self.port_number))
+        server_socket.listen(self.backlog)
+        return server_socket
 
-            except socket.error:
-                return
+    def offer_message(self, arena=None):
+        """
+            pack the udp offer message announcing the tcp port of the server
+        :param arena: the arena in the lobby, it's load follows the offer if announce_load is set. None for the offer
+                      alone
+        :return: the packed offer message
+        :rtype: bytes
+        """
 
-        player[KEY_COUNTER_INDEX] += key_counter
+        return pack_offer(self.port_number, arena.load() if arena and self.announce_load else None)
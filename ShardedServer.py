@@ -0,0 +1,200 @@
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from Server import Server, INTERFACE, OFFER_INTERVAL, GROUPS
+from AcceptLoop import BACKLOG
+from Metrics import RoundProfiler
+from Replay import Recorder
+
+
+class ShardWorker(Server):
+    """
+        a server running in a worker process - it accepts and plays it's own games on the tcp port it shares with
+        the other workers through SO_REUSEPORT. the coordinator broadcasts the offers and keeps the all time records
+    """
+
+    def __init__(self, name, lobby_policy, interface, port_number, records_connection, groups=GROUPS,
+                 backlog=BACKLOG, key_limiter=None):
+        """
+        :param port_number: the tcp port shared by the workers
+        :param records_connection: pipe to the coordinator, used to update the all time records
+        :param groups: number of groups in every game
+        :param backlog: connections the kernel queues for the worker until they are accepted
+        :param key_limiter: the KeyLimiter of the coordinator, the default limits if None
+        """
+
+        super().__init__(name, lobby_policy, interface)
+        self.port_number = port_number
+        self.groups = groups
+        self.backlog = backlog
+        if key_limiter:
+            self.key_limiter = key_limiter
+        self.records_connection = records_connection
+
+    def start_server(self):
+        print("Worker {pid} started, listening on {IP} address".format(pid=os.getpid(), IP=self.server_ip))
+        self.listen()
+        while True:
+            self.waiting_for_clients()
+            self.game_mode()
+
+    def broadcast_offer(self):
+        """
+            the coordinator broadcasts the offers for all the workers
+        """
+        pass
+
+    def create_server_socket(self):
+        """
+            create a listening tcp socket sharing the port with the other workers,
+            the kernel spreads new connections between the workers that are listening
+        """
+
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        server_socket.bind((self.server_ip, self.port_number))
+        server_socket.listen(self.backlog)
+        return server_socket
+
+    def update_records(self, sums, rosters, keys=None):
+        """
+            the records are global to all the workers, let the coordinator update them and record the game
+        """
+
+        with self.records_lock:  # one request at a time on the pipe
+            try:
+                self.records_connection.send((sums, rosters, keys))
+                return self.records_connection.recv()
+            except (EOFError, OSError):  # the coordinator is gone, the game still ends with the records we know
+                print("Worker {pid} lost the coordinator, keeping it's own records".format(pid=os.getpid()))
+        return super().update_records(sums, rosters, keys)
+
+
+def run_worker(name, lobby_policy, interface, port_number, records_connection, groups, backlog, key_limiter,
+               instrumentation=None, recording=None):
+    """
+        entry point of a worker process
+    :param instrumentation: None, or (metrics port, profile kind, profile directory) to instrument the worker
+    :param recording: None, or (path, ring size) to record the games of the worker to path.pid
+    """
+    worker = ShardWorker(name, lobby_policy, interface, port_number, records_connection, groups, backlog,
+                         key_limiter)
+    if instrumentation:
+        metrics_port, profile, profile_directory = instrumentation
+        worker.use_metrics(metrics_port, RoundProfiler(profile, profile_directory) if profile else None)
+    if recording:
+        path, ring_size = recording
+        worker.use_recorder(Recorder("{path}.{pid}".format(path=path, pid=os.getpid()), ring_size))
+    worker.start_server()
+
+
+class ShardedServer(Server):
+    """
+        coordinator of a worker process per cpu core. the workers accept and play games on the shared tcp port,
+        the coordinator broadcasts the udp offers and owns the all time records
+    """
+
+    def __init__(self, name, lobby_policy=None, workers=None, interface=INTERFACE):
+
+        super().__init__(name, lobby_policy, interface)
+        self.workers = workers if workers else os.cpu_count()
+        self.instrumentation = None  # how to instrument the workers, see use_metrics
+        self.recording = None  # how the workers record their games, see use_recorder
+        self.processes = []  # the worker processes
+
+    def start_server(self):
+        """
+            start the workers then broadcast offers for good
+        """
+        if not hasattr(socket, 'SO_REUSEPORT'):
+            raise OSError("SO_REUSEPORT is not supported on this platform")
+
+        print("Server started with {workers} workers, listening on {IP} address".format(workers=self.workers,
+                                                                                         IP=self.server_ip))
+        for i in range(self.workers):
+            records_connection, worker_connection = multiprocessing.Pipe()
+            instrumentation = None
+            if self.instrumentation:  # every worker serves it's own metrics, on the port following the previous one
+                metrics_port, profile, profile_directory = self.instrumentation
+                if metrics_port is not None:
+                    metrics_port += i + 1
+                instrumentation = (metrics_port, profile, profile_directory)
+            worker = multiprocessing.Process(target=run_worker,
+                                             args=(self.name, self.lobby_policy, self.interface, self.port_number,
+                                                   worker_connection, self.groups, self.backlog, self.key_limiter,
+                                                   instrumentation, self.recording,),
+                                             daemon=True)
+            worker.start()
+            self.processes.append(worker)
+            threading.Thread(target=self.serve_records, args=(records_connection,), daemon=True).start()
+
+        # installed once the workers are forked, so they don't inherit it
+        signal.signal(signal.SIGTERM, self.terminate)
+        self.broadcast_offer()
+
+    def terminate(self, signum, frame):
+        """
+            terminate the workers with the coordinator - daemon processes are only terminated on a normal exit, a
+            terminated coordinator would leave them playing on the port
+        """
+
+        for worker in self.processes:
+            worker.terminate()
+        for worker in self.processes:
+            worker.join()
+        sys.exit(0)
+
+    def use_metrics(self, metrics_port=None, profiler=None):
+        """
+            instrument the coordinator, serving it's metrics on metrics_port, and the workers.
+            the workers play the games - worker i serves it's metrics on metrics_port + i + 1
+            and profiles it's games if there is a profiler
+        """
+
+        super().use_metrics(metrics_port)
+        self.instrumentation = (metrics_port, profiler.kind if profiler else None,
+                                profiler.directory if profiler else None)
+
+    def use_recorder(self, recorder):
+        """
+            the workers play the games - every worker records it's games to the path of the recorder followed by
+            the pid of the worker. the coordinator has nothing to record
+        """
+
+        self.recording = (recorder.path, recorder.ring_size)
+        recorder.close()
+
+    def serve_records(self, records_connection):
+        """
+            update the all time records with the results sent by a worker and send it back the updated records
+        :param records_connection: pipe to the worker
+        """
+        while True:
+            try:
+                result = records_connection.recv()
+            except EOFError:  # the worker exited
+                return
+            try:
+                records_connection.send(self.update_records(*result))
+            except OSError:  # the worker exited while the records were updated
+                return
+
+    def broadcast_offer(self):
+        """
+            broadcast udp offers every second for good on behalf of all the workers
+        """
+        broadcast_ip = '<broadcast>'
+        sock = socket.socket(socket.AF_INET,  # Internet
+                             socket.SOCK_DGRAM)  # UDP
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+
+        message = self.offer_message()
+        while True:
+            sock.sendto(message, (broadcast_ip, self.udp_port))
+            self.metrics.increment('offers_sent_total')
+            time.sleep(OFFER_INTERVAL)
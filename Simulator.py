@@ -0,0 +1,92 @@
+import time
+from Server import Arena, Player
+from Protocol import COUNT, SUM, TEXT_PROTOCOL, BinaryProtocol, unpack_sums
+from Replay import REGISTRATION, ROUND, REGISTER, GAME, KEYS, RESULT, DRAINED
+from RateLimiter import KeyLimiter, unpack_limits
+
+
+class ReplayedRound:
+    """
+        the state of a round being replayed
+    """
+
+    def __init__(self, arena):
+
+        self.arena = arena
+        self.players = {}  # player number to Player
+        self.started = None  # time the game started at in the recording
+        self.keys_events = 0
+        self.drained_events = 0
+        self.recorded_sums = None  # None if the recording doesn't reach the end of the round
+        self.replayed_sums = None
+
+
+class Simulator:
+    """
+        replays recorded rounds through the scoring of the server - every arrival of keys is ingested by an arena
+        the way it was received, at the time it was received so the key limiter of the round discards the same keys,
+        and the sums it ends with are compared with the recorded ones.
+        rounds are replayed as fast as possible, or at a multiple of the recorded speed
+    """
+
+    def __init__(self, server, speed=None):
+        """
+        :param server: the server owning the arenas and the all time records, it isn't started
+        :param speed: multiple of the recorded speed, None to replay as fast as possible
+        """
+
+        self.server = server
+        self.speed = speed
+
+    def replay(self, events):
+        """
+        :param events: the recorded events, see read_events
+        :return: the ReplayedRound of every round, by round number
+        :rtype: dict
+        """
+
+        rounds = {}
+        first = events[0][2] if events else 0
+        start = time.time()
+
+        for event_type, round_number, timestamp, player_number, payload in events:
+            if self.speed:
+                delay = (timestamp - first) / self.speed - (time.time() - start)
+                if delay > 0:
+                    time.sleep(delay)
+
+            if event_type == ROUND:
+                groups, = COUNT.unpack_from(payload)
+                arena = Arena(self.server, self.server.lobby_policy, groups=groups)
+                # recorded before the rounds carried their limits, nothing was discarded
+                arena.limiter = unpack_limits(payload, COUNT.size) if len(payload) > COUNT.size else KeyLimiter()
+                rounds[round_number] = ReplayedRound(arena)
+                continue
+            replayed = rounds.get(round_number)
+            if replayed is None:  # the beginning of the round was overwritten in the ring
+                continue
+            arena = replayed.arena
+
+            if event_type == REGISTER:
+                group, binary = REGISTRATION.unpack_from(payload)
+                name = payload[REGISTRATION.size:].decode()
+                player = Player(name, None, None, BinaryProtocol() if binary else TEXT_PROTOCOL, group, player_number)
+                arena.groups[group].append(player)
+                arena.registered.append(player)
+                replayed.players[player_number] = player
+            elif event_type == GAME:
+                replayed.started = timestamp
+                arena.start_game(timestamp)
+            elif event_type == KEYS:
+                replayed.keys_events += 1
+                arena.ingest(replayed.players[player_number], payload, timestamp)
+            elif event_type == DRAINED:
+                replayed.drained_events += 1
+                arena.drain(replayed.players[player_number], SUM.unpack(payload)[0], timestamp)
+            elif event_type == RESULT:
+                replayed.recorded_sums = unpack_sums(payload, 0)[0]
+                replayed.replayed_sums = arena.result()[0]
+                if replayed.started is not None:
+                    arena.report_ingestion(timestamp - replayed.started)
+
+        return rounds
@@ -0,0 +1,24 @@
+import argparse
+from Benchmark import run_benchmark, BENCHMARK_INTERFACE, SERVER_PORT
+from Client import KEY_RATE
+
+
+def start_benchmark():
+    parser = argparse.ArgumentParser(description="run a swarm of bots against a local server and report the results",
+                                     epilog="arguments after -- are passed on to runServer.py")
+    parser.add_argument('--bots', type=int, default=1000, help="number of simulated teams")
+    parser.add_argument('--rate', type=float, default=KEY_RATE,
+                        help="average key-presses per second of every bot, 0 to never type")
+    parser.add_argument('--burst', type=int, default=1, help="key-presses a bot types at once")
+    parser.add_argument('--keys', type=int, default=None, help="key-presses every bot types in the game")
+    parser.add_argument('--interface', default=BENCHMARK_INTERFACE, help="network interface of the server")
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help="tcp port of the server")
+    parser.add_argument('server_args', nargs=argparse.REMAINDER, help="extra arguments of runServer.py")
+    args = parser.parse_args()
+
+    server_args = args.server_args[1:] if args.server_args[:1] == ['--'] else args.server_args
+    run_benchmark(args.bots, args.rate, args.burst, args.keys, args.interface, args.port, server_args)
+
+
+if __name__ == '__main__':
+    start_benchmark()
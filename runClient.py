@@ -1,8 +1,42 @@
-from Client import Client
+import argparse
+from Client import Client, SyntheticKeyboard, INTERFACE, KEY_RATE, NODELAY_POLICY, CORK_POLICY
+from Discovery import OFFER_WINDOW, FIRST_SEEN, LOWEST_RTT, LEAST_LOADED, FirstSeenPolicy, LowestRttPolicy, \
+    LeastLoadedPolicy
+
+
+def discovery_policy(args):
+    """
+        choose the policy picking the server according to the command line arguments
+    """
+    if args.discovery == LOWEST_RTT:
+        return LowestRttPolicy(args.offer_window)
+    if args.discovery == LEAST_LOADED:
+        return LeastLoadedPolicy(args.offer_window)
+    return FirstSeenPolicy()
 
 
 def start_client():
-    client = Client("TheDirtyCows")
+    parser = argparse.ArgumentParser(description="Keyboard Spamming Battle Royale client")
+    parser.add_argument('--name', default="TheDirtyCows", help="the team name")
+    parser.add_argument('--interface', default=INTERFACE, help="network interface to listen on for offers")
+    parser.add_argument('--socket-policy', choices=[NODELAY_POLICY, CORK_POLICY], default=None,
+                        help="TCP_NODELAY or TCP_CORK for sending the batches of key-presses")
+    parser.add_argument('--binary', action='store_true',
+                        help="speak the binary protocol - length prefixed frames instead of text")
+    parser.add_argument('--discovery', choices=[FIRST_SEEN, LOWEST_RTT, LEAST_LOADED], default=FIRST_SEEN,
+                        help="connect to the first server offering a game, to the one that was fastest to connect "
+                             "or to the one with the emptiest lobby, among the servers started with --offer-load")
+    parser.add_argument('--offer-window', type=float, default=OFFER_WINDOW,
+                        help="seconds to collect offers for before choosing a server")
+    parser.add_argument('--bot', action='store_true', help="headless bot typing synthetic key-presses")
+    parser.add_argument('--rate', type=float, default=KEY_RATE,
+                        help="average key-presses per second of the bot, 0 to never type")
+    parser.add_argument('--burst', type=int, default=1, help="key-presses the bot types at once")
+    parser.add_argument('--keys', type=int, default=None, help="key-presses the bot types in a game")
+    args = parser.parse_args()
+
+    keyboard = SyntheticKeyboard(args.rate, args.burst, args.keys) if args.bot else None
+    client = Client(args.name, args.socket_policy, keyboard, args.interface, args.binary, discovery_policy(args))
     client.start_client()
 
 
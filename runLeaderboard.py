@@ -0,0 +1,40 @@
+import argparse
+import time
+from Leaderboard import Leaderboard, LEADERBOARD_PATH
+
+
+def show_leaderboard():
+    parser = argparse.ArgumentParser(description="Keyboard Spamming Battle Royale all time rankings")
+    parser.add_argument('--path', default=LEADERBOARD_PATH, help="the sqlite file written by runServer.py")
+    parser.add_argument('--top', type=int, default=10, help="number of teams and games to rank")
+    parser.add_argument('--team', default=None, help="show the best result of a single team")
+    args = parser.parse_args()
+
+    leaderboard = Leaderboard(args.path)
+    if args.team:
+        best = leaderboard.team_best(args.team)
+        if best is None:
+            print("{name} never played".format(name=args.team))
+        else:
+            print("{name}: best {keys} keys in {games} games, last played {last}".format(
+                name=args.team, keys=best[0], games=best[1], last=time.ctime(best[2])))
+        return
+
+    max_score, min_score = leaderboard.records()
+    print("The maximum score ever was: {max}\nThe minimum score ever was: {min}\n".format(max=max_score,
+                                                                                       min=min_score))
+    print("Top teams:\n==")
+    for name, keys, games in leaderboard.top_teams(args.top):
+        print("{name}: {keys} keys ({games} games)".format(name=name, keys=keys, games=games))
+    print("\nTop games:\n==")
+    for played_at, winner_group, sums in leaderboard.top_games(args.top):
+        scores = " to ".join(str(group_sum) for group_sum in sorted(sums, reverse=True))
+        if min(sums) == max(sums):
+            print("{time}: draw {scores}".format(time=time.ctime(played_at), scores=scores))
+        else:
+            print("{time}: group {group} won {scores}".format(time=time.ctime(played_at), group=winner_group,
+                                                             scores=scores))
+
+
+if __name__ == '__main__':
+    show_leaderboard()
@@ -0,0 +1,49 @@
+import argparse
+import time
+from Server import Server
+from Replay import read_events
+from Simulator import Simulator
+
+
+def replay():
+    parser = argparse.ArgumentParser(description="Keyboard Spamming Battle Royale offline replay of recorded rounds")
+    parser.add_argument('path', help="a recording written by runServer.py --record")
+    parser.add_argument('--speed', type=float, default=None,
+                        help="replay at this multiple of the recorded speed, as fast as possible by default")
+    parser.add_argument('--interface', default='lo', help="network interface of the replaying server, it isn't used")
+    args = parser.parse_args()
+
+    events = read_events(args.path)
+    simulator = Simulator(Server("TheDirtyCows", interface=args.interface), args.speed)
+    start = time.time()
+    rounds = simulator.replay(events)
+    elapsed = time.time() - start
+
+    identical = 0
+    finished = 0
+    for round_number, replayed in sorted(rounds.items()):
+        if replayed.recorded_sums is None:
+            print("round {number}: not finished in the recording".format(number=round_number))
+            continue
+        finished += 1
+        same = replayed.recorded_sums == replayed.replayed_sums
+        identical += same
+        print("round {number}: {teams} teams, {arrivals} arrivals, {discarded} keys discarded, {abusive} flooding, "
+              "recorded {recorded} replayed {replayed} {verdict}"
+              .format(number=round_number, teams=len(replayed.players),
+                      arrivals=replayed.keys_events + replayed.drained_events,
+                      discarded=replayed.arena.limiter.discarded, abusive=len(replayed.arena.limiter.abusive),
+                      recorded=replayed.recorded_sums, replayed=replayed.replayed_sums,
+                      verdict="identical" if same else "DIFFERENT"))
+
+    arrivals = sum(replayed.keys_events + replayed.drained_events for replayed in rounds.values())
+    received = sum(replayed.arena.received_bytes for replayed in rounds.values())
+    print("\nrounds: {finished} identical: {identical}".format(finished=finished, identical=identical))
+    print("replayed {arrivals} arrivals ({received} bytes) in {elapsed:.3f} s: {rate:.0f} arrivals per second, "
+          "{throughput:.1f} MB per second".format(arrivals=arrivals, received=received, elapsed=elapsed,
+                                                   rate=arrivals / elapsed if elapsed else 0,
+                                                   throughput=received / elapsed / 1024 / 1024 if elapsed else 0))
+
+
+if __name__ == '__main__':
+    replay()
@@ -1,8 +1,95 @@
-from Server import Server
+import argparse
+from Server import Server, INTERFACE, GROUPS
+from AsyncServer import AsyncServer
+from ArenaServer import ArenaServer
+from ShardedServer import ShardedServer
+from AcceptLoop import BACKLOG
+from Leaderboard import Leaderboard
+from Replay import Recorder
+from RateLimiter import KeyLimiter
+from Metrics import RoundProfiler, CPU_PROFILE, MEMORY_PROFILE
+from LobbyPolicy import LOBBY_WINDOW, FixedWindowPolicy, MaxPlayersPolicy, QuorumPolicy
+
+
+def lobby_policy(args):
+    """
+        choose the lobby policy according to the command line arguments
+    """
+    if args.min_players:
+        return QuorumPolicy(args.min_players, args.grace, args.window, args.max_players)
+    if args.max_players:
+        return MaxPlayersPolicy(args.max_players, args.window)
+    return FixedWindowPolicy(args.window)
 
 
 def start_server():
-    server = Server("TheDirtyCows")
+    parser = argparse.ArgumentParser(description="Keyboard Spamming Battle Royale server")
+    parser.add_argument('--async', dest='use_asyncio', action='store_true',
+                        help="run the lobby and the game on a single asyncio event loop")
+    parser.add_argument('--arenas', type=int, default=None,
+                        help="run up to this many games at once on the same port")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="fork this many worker processes sharing the port, 0 for one per cpu core")
+    parser.add_argument('--interface', default=INTERFACE,
+                        help="network interface to listen on, e.g. lo for a local benchmark")
+    parser.add_argument('--port', type=int, default=2049,
+                        help="tcp port the teams connect to")
+    parser.add_argument('--backlog', type=int, default=BACKLOG,
+                        help="connections the kernel queues until they are accepted, capped by net.core.somaxconn")
+    parser.add_argument('--offer-load', action='store_true',
+                        help="send the load of the lobby after every offer, for clients choosing the least loaded "
+                             "server. clients older than the load ignore such offers")
+    parser.add_argument('--window', type=float, default=LOBBY_WINDOW,
+                        help="maximal seconds the lobby stays open")
+    parser.add_argument('--max-players', type=int, default=None,
+                        help="start the game as soon as this many teams joined")
+    parser.add_argument('--min-players', type=int, default=None,
+                        help="start the game a grace period after this many teams joined")
+    parser.add_argument('--grace', type=float, default=2,
+                        help="seconds to wait for more teams once --min-players joined")
+    parser.add_argument('--groups', type=int, default=GROUPS,
+                        help="number of groups the teams are split into")
+    parser.add_argument('--key-rate', type=float, default=None,
+                        help="key-presses per second counted for a team, the rest are discarded. no limit by default, "
+                             "a human spamming the keyboard stays well under 50")
+    parser.add_argument('--key-burst', type=float, default=None,
+                        help="key-presses a team may type at once, two seconds of --key-rate by default")
+    parser.add_argument('--group-key-rate', type=float, default=None,
+                        help="key-presses per second counted for a whole group, no limit by default")
+    parser.add_argument('--group-key-burst', type=float, default=None,
+                        help="key-presses a group may type at once, two seconds of --group-key-rate by default")
+    parser.add_argument('--leaderboard', default=None,
+                        help="sqlite file recording every game, the all time records continue across restarts")
+    parser.add_argument('--record', default=None,
+                        help="record every round to this file, to be replayed by runReplay.py")
+    parser.add_argument('--record-ring', type=int, default=None,
+                        help="keep only the latest MB of the recording, in a memory mapped ring file")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="serve metrics on http://127.0.0.1:PORT/metrics (prometheus) and /metrics.json")
+    parser.add_argument('--profile', choices=[CPU_PROFILE, MEMORY_PROFILE], default=None,
+                        help="dump a cProfile or tracemalloc profile of every game")
+    parser.add_argument('--profile-dir', default='.', help="where the profiles are dumped")
+    args = parser.parse_args()
+
+    if args.use_asyncio:
+        server = AsyncServer("TheDirtyCows", lobby_policy(args), args.interface)
+    elif args.workers is not None:
+        server = ShardedServer("TheDirtyCows", lobby_policy(args), args.workers, args.interface)
+    elif args.arenas:
+        server = ArenaServer("TheDirtyCows", lobby_policy(args), args.arenas, args.interface)
+    else:
+        server = Server("TheDirtyCows", lobby_policy(args), args.interface)
+    server.port_number = args.port
+    server.groups = args.groups
+    server.backlog = args.backlog
+    server.announce_load = args.offer_load
+    server.key_limiter = KeyLimiter(args.key_rate or None, args.key_burst, args.group_key_rate, args.group_key_burst)
+    if args.leaderboard:
+        server.use_leaderboard(Leaderboard(args.leaderboard))
+    if args.record:
+        server.use_recorder(Recorder(args.record, args.record_ring * 1024 * 1024 if args.record_ring else None))
+    if args.metrics_port is not None or args.profile:
+        server.use_metrics(args.metrics_port, RoundProfiler(args.profile, args.profile_dir) if args.profile else None)
     server.start_server()
 
 
@@ -0,0 +1,52 @@
+import errno
+import socket
+import time
+import unittest
+from AcceptLoop import AcceptLoop
+from Server import TeamNameReader
+
+
+class ExhaustedListener(socket.socket):
+    """
+        a listening socket whose accept fails as if the process ran out of file descriptors
+    """
+
+    accepts = 0
+
+    def accept(self):
+        self.accepts += 1
+        raise OSError(errno.EMFILE, "Too many open files")
+
+
+class AcceptLoopTest(unittest.TestCase):
+
+    def setUp(self):
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(8)
+        self.joined = []
+
+    def tearDown(self):
+        self.listener.close()
+
+    def run_loop(self, listener, seconds, poll_interval):
+        deadline = time.time() + seconds
+        loop = AcceptLoop(listener, lambda *team: self.joined.append(team), TeamNameReader, 1)
+        loop.run(lambda: time.time() >= deadline, poll_interval)
+        return loop
+
+    def test_names_are_read(self):
+        with socket.create_connection(self.listener.getsockname()) as client:
+            client.sendall(b"cows\n")
+            self.run_loop(self.listener, 0.2, 0.05)
+        self.assertEqual([team[0] for team in self.joined], ["cows"])
+
+    def test_backs_off_when_out_of_file_descriptors(self):
+        listener = ExhaustedListener(fileno=self.listener.detach())
+        with listener, socket.create_connection(listener.getsockname()):  # the listener stays readable
+            self.run_loop(listener, 0.3, 0.1)
+        self.assertLessEqual(listener.accepts, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
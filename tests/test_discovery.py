@@ -0,0 +1,112 @@
+import socket
+import threading
+import unittest
+from Discovery import Discovery, Offer, FirstSeenPolicy, LowestRttPolicy, LeastLoadedPolicy, RTT_WEIGHT
+from Protocol import OFFER_HEADER, MAGIC_COOKIE, OFFER, pack_offer
+
+
+def offers(*ports, **loads):
+    """
+    :param loads: (capacity, players) of the servers by 'port' followed by the port number
+    """
+    return [Offer('127.0.0.1', port, 0, *loads.get('port{}'.format(port), (None, None))) for port in ports]
+
+
+class PolicyTest(unittest.TestCase):
+
+    def test_first_seen(self):
+        self.assertEqual(FirstSeenPolicy().window, 0)
+        self.assertEqual(FirstSeenPolicy().choose(offers(1, 2), {}).server_port, 1)
+
+    def test_lowest_rtt(self):
+        rtts = {('127.0.0.1', 1): 0.3, ('127.0.0.1', 2): 0.1}
+        self.assertEqual(LowestRttPolicy().choose(offers(1, 2), rtts).server_port, 2)
+
+    def test_least_loaded(self):
+        loaded = offers(1, 2, 3, 4, port1=(10, 5), port2=(4, 1), port3=(8, 4))
+        self.assertEqual(LeastLoadedPolicy().choose(loaded, {}).server_port, 2)
+
+    def test_least_loaded_ranks_unknown_load_last(self):
+        self.assertEqual(LeastLoadedPolicy().choose(offers(1, 2, port2=(4, 3)), {}).server_port, 2)
+        self.assertEqual(LeastLoadedPolicy().choose(offers(1, 2, port2=(0, 50)), {}).server_port, 2)
+
+    def test_lowest_rtt_tries_new_servers_first(self):
+        rtts = {('127.0.0.1', 1): 0.3, ('127.0.0.1', 2): 0.1}
+        self.assertEqual(LowestRttPolicy().choose(offers(1, 2, 3), rtts).server_port, 3)
+
+
+class DiscoveryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.discovery = Discovery('127.0.0.1', port=0, policy=LowestRttPolicy())
+        self.discovery.open()
+        self.address = self.discovery.sock.getsockname()
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def tearDown(self):
+        self.discovery.close()
+        self.server.close()
+
+    def offer(self, port, load=None):
+        self.server.sendto(pack_offer(port, load), self.address)
+
+    def discover(self, *offers):
+        """
+            discover while the offers are broadcast every 50ms, like servers in the lobby do
+        :param offers: (port, load) of every offer, in the order they are broadcast
+        :return: the chosen Offer
+        """
+
+        stopped = threading.Event()
+
+        def broadcast():
+            while not stopped.wait(0.05):
+                for port, load in offers:
+                    self.offer(port, load)
+
+        broadcaster = threading.Thread(target=broadcast)
+        broadcaster.start()
+        try:
+            return self.discovery.discover()
+        finally:
+            stopped.set()
+            broadcaster.join()
+
+    def test_invalid_offers_are_skipped(self):
+        self.server.sendto(b'\xef\xbe', self.address)
+        self.server.sendto(OFFER_HEADER.pack(0xdeadbeef, OFFER, 2049), self.address)
+        self.server.sendto(OFFER_HEADER.pack(MAGIC_COOKIE, 0x3, 2049), self.address)
+        self.offer(2050)
+        self.assertEqual(self.discovery.receive_offer(1).address(), ('127.0.0.1', 2050))
+        self.assertIsNone(self.discovery.receive_offer(0.05))
+
+    def test_stale_offers_are_discarded(self):
+        self.offer(2049)
+        self.discovery.rtts = {('127.0.0.1', 2049): 0.01, ('127.0.0.1', 2050): 0.3, ('127.0.0.1', 2051): 0.1}
+        chosen = self.discover((2050, None), (2051, None))
+        self.assertEqual(chosen.address(), ('127.0.0.1', 2051))
+
+    def test_offer_with_load(self):
+        self.offer(2049, (8, 3))
+        offer = self.discovery.receive_offer(1)
+        self.assertEqual((offer.capacity, offer.players), (8, 3))
+        self.assertFalse(offer.is_full())
+
+    def test_full_lobbies_are_passed_over(self):
+        self.discovery.policy = FirstSeenPolicy()
+        chosen = self.discover((2050, (4, 4)), (2051, (0, 100)))
+        self.assertEqual(chosen.address(), ('127.0.0.1', 2051))
+
+    def test_server_filling_up_in_the_window(self):
+        self.discovery.policy = LeastLoadedPolicy(0.3)
+        chosen = self.discover((2050, (4, 1)), (2051, (4, 2)), (2050, (4, 4)))  # the latest offer of a server counts
+        self.assertEqual(chosen.address(), ('127.0.0.1', 2051))
+
+    def test_record_rtt(self):
+        self.discovery.record_rtt(('127.0.0.1', 2049), 0.2)
+        self.discovery.record_rtt(('127.0.0.1', 2049), 1.0)
+        self.assertAlmostEqual(self.discovery.rtts[('127.0.0.1', 2049)], 0.2 + RTT_WEIGHT * 0.8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import asyncio
+import socket
+import unittest
+from AsyncServer import AsyncServer
+from FanOut import FanOut
+from Server import Player
+
+LARGE = 16 * 1024 * 1024  # more than the socket buffers hold, a client that doesn't read never gets all of it
+
+
+def read_all(sock):
+    """
+    :return: everything the socket receives until the other side closes it
+    :rtype: bytes
+    """
+
+    data = bytearray()
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return bytes(data)
+        data.extend(chunk)
+
+
+class FanOutTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pairs = [socket.socketpair() for i in range(3)]
+        for client, connection in self.pairs:
+            client.settimeout(5)
+            connection.settimeout(7)
+
+    def tearDown(self):
+        for client, connection in self.pairs:
+            client.close()
+            connection.close()
+
+    def test_every_client_gets_its_own_message(self):
+        messages = [b"welcome", b"welcome", b"binary welcome"]
+        dropped = FanOut().send((connection, message) for (client, connection), message in zip(self.pairs, messages))
+        self.assertEqual(dropped, 0)
+        for (client, connection), message in zip(self.pairs, messages):
+            self.assertEqual(client.recv(100), message)
+            self.assertEqual(connection.gettimeout(), 7)
+
+    def test_slow_client_is_dropped_and_left_open(self):
+        (slow, slow_connection), (client, connection) = self.pairs[:2]
+        dropped = FanOut(timeout=0.2).send([(slow_connection, bytes(LARGE)), (connection, b"welcome")])
+        self.assertEqual(dropped, 1)
+        self.assertEqual(client.recv(100), b"welcome")
+        self.assertNotEqual(slow_connection.fileno(), -1)
+        self.assertEqual(slow_connection.gettimeout(), 7)
+
+    def test_closed_socket_is_dropped(self):
+        client, connection = self.pairs[0]
+        connection.close()
+        self.assertEqual(FanOut().send([(connection, b"welcome")]), 1)
+
+    def test_close_after_the_message(self):
+        client, connection = self.pairs[0]
+        client.sendall(b"keys still in flight")
+        # delivered, the client just doesn't close it's side in time
+        self.assertEqual(FanOut(timeout=0.2, close=True).send([(connection, b"results")]), 0)
+        self.assertEqual(read_all(client), b"results")
+        self.assertEqual(connection.fileno(), -1)
+
+    def test_slow_client_is_closed_with_close(self):
+        slow, slow_connection = self.pairs[0]
+        self.assertEqual(FanOut(timeout=0.2, close=True).send([(slow_connection, bytes(LARGE))]), 1)
+        self.assertEqual(slow_connection.fileno(), -1)
+
+
+class AsyncSendTest(unittest.TestCase):
+
+    def send(self, close):
+        """
+            send a message too large to be read in time to a client that doesn't read
+        :return: if the message was delivered and if the connection is closing
+        :rtype: tuple
+        """
+
+        async def send():
+            reader, writer = await asyncio.open_connection(sock=connection)
+            player = Player("team", (reader, writer), ('127.0.0.1', 0))
+            delivered = await AsyncServer("test", interface='lo').send(player, b"x" * LARGE, close, 0.2)
+            closing = writer.transport.is_closing()
+            writer.close()
+            return delivered, closing
+
+        client, connection = socket.socketpair()
+        loop = asyncio.new_event_loop()
+        with client:
+            try:
+                return loop.run_until_complete(send())
+            finally:
+                loop.close()
+
+    def test_slow_client_is_left_open(self):
+        self.assertEqual(self.send(False), (False, False))
+
+    def test_slow_client_is_closed_when_asked(self):
+        self.assertEqual(self.send(True), (False, True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from Leaderboard import Leaderboard
+from Server import Server
+
+
+class LeaderboardTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "leaderboard.db")
+        self.leaderboard = None
+
+    def tearDown(self):
+        if self.leaderboard:
+            self.leaderboard.close()
+            self.leaderboard.connection.close()
+        shutil.rmtree(self.directory)
+
+    def written(self, *games):
+        """
+            record games and wait until they are written
+        :return: a new leaderboard over the same database
+        :rtype: Leaderboard
+        """
+
+        leaderboard = Leaderboard(self.path, flush_interval=0)
+        for game in games:
+            leaderboard.record_game(*game)
+        leaderboard.close()
+        leaderboard.connection.close()
+        self.leaderboard = Leaderboard(self.path)
+        return self.leaderboard
+
+    def test_empty(self):
+        leaderboard = self.written()
+        self.assertEqual(leaderboard.records(), (None, None))
+        self.assertEqual(leaderboard.best_teams(), (0, []))
+        self.assertEqual(leaderboard.top_teams(5), [])
+        self.assertIsNone(leaderboard.team_best("cows"))
+
+    def test_records(self):
+        leaderboard = self.written(([30, 12], [["a", "b"], ["c"]], [[10, 20], [12]]),
+                                   ([5, 40], [["a"], ["d", "e"]], [[5], [25, 15]]),
+                                   ([7, 7], [["f"], ["g"]], [[7], [7]]))
+        self.assertEqual(leaderboard.records(), (40, 5))
+
+    def test_best_teams_are_the_first_group_to_score_the_maximum(self):
+        leaderboard = self.written(([30, 12], [["a", "b"], ["c"]], [[10, 20], [12]]),
+                                   ([12, 40], [["a"], ["d", "e"]], [[12], [25, 15]]),
+                                   ([40, 3], [["f"], ["g"]], [[40], [3]]))
+        self.assertEqual(leaderboard.best_teams(), (40, ["d", "e"]))
+
+    def test_draw_is_won_by_group_1(self):
+        leaderboard = self.written(([7, 7], [["f"], ["g"]], [[7], [7]]))
+        self.assertEqual(leaderboard.best_teams(), (7, ["f"]))
+        self.assertEqual(leaderboard.records(), (7, 7))
+
+    def test_top_teams_rank_the_best_game_of_every_team(self):
+        leaderboard = self.written(([30, 12], [["a", "b"], ["c"]], [[10, 20], [12]]),
+                                   ([5, 40], [["a"], ["d", "e"]], [[5], [25, 15]]),
+                                   ([50, 0], [["a"], ["b"]], [[50], [0]]))
+        self.assertEqual(leaderboard.top_teams(3), [("a", 50, 3), ("d", 25, 1), ("b", 20, 2)])
+        self.assertEqual(leaderboard.team_best("c")[:2], (12, 1))
+
+    def test_sums_of_every_group(self):
+        leaderboard = self.written(([3, 9, 5], [["a"], ["b"], ["c"]], [[3], [9], [5]]),
+                                   ([4, 4], [["a"], ["b"]], [[4], [4]]))
+        self.assertEqual([game[1:] for game in leaderboard.top_games(5)], [(2, [3, 9, 5]), (1, [4, 4])])
+        self.assertEqual(leaderboard.records(), (9, 3))
+
+    def test_sums_kept_in_the_games_table_are_migrated(self):
+        with sqlite3.connect(self.path) as connection:
+            connection.executescript("""
+                CREATE TABLE games (id INTEGER PRIMARY KEY, played_at REAL NOT NULL, sum_group1 INTEGER NOT NULL,
+                    sum_group2 INTEGER NOT NULL, winner_group INTEGER NOT NULL, winner_sum INTEGER NOT NULL,
+                    loser_sum INTEGER NOT NULL);
+                CREATE TABLE teams (game_id INTEGER NOT NULL REFERENCES games (id), name TEXT NOT NULL,
+                    group_number INTEGER NOT NULL, keys INTEGER NOT NULL);
+                INSERT INTO games VALUES (1, 0, 3, 9, 2, 9, 3), (2, 1, 6, 0, 1, 6, 0);
+                INSERT INTO teams VALUES (1, 'a', 1, 3), (1, 'b', 2, 9), (1, 'c', 3, 4), (2, 'a', 1, 6);
+            """)
+        connection.close()
+
+        leaderboard = self.written(([2, 8], [["d"], ["e"]], [[2], [8]]))
+        self.assertEqual([game[1:] for game in leaderboard.top_games(5)], [(2, [3, 9, 4]), (2, [2, 8]), (1, [6])])
+        self.assertEqual(leaderboard.best_teams(), (9, ["b"]))
+
+    def test_games_without_keys(self):
+        leaderboard = self.written(([3, 1], [["a"], ["b"]]))
+        self.assertEqual(leaderboard.top_teams(2), [("a", 0, 1), ("b", 0, 1)])
+
+    def test_server_continues_the_records(self):
+        game_server = Server("test", interface='lo')
+        game_server.use_leaderboard(self.written(([30, 12], [["a", "b"], ["c"]]), ([5, 40], [["a"], ["d", "e"]])))
+        self.assertEqual((game_server.max_score, game_server.min_score, game_server.best_team_ever),
+                         (40, 5, ["d", "e"]))
+        self.assertEqual(game_server.update_records([20, 9], [["f"], ["g"]])[:2], (40, 5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import copy
+import unittest
+from LobbyPolicy import FixedWindowPolicy, MaxPlayersPolicy, QuorumPolicy
+
+
+class FixedWindowPolicyTest(unittest.TestCase):
+
+    def test_window(self):
+        policy = FixedWindowPolicy(10)
+        self.assertEqual(policy.time_left(0, 4), 6)
+        self.assertEqual(policy.time_left(1000, 4), 6)
+        self.assertFalse(policy.is_full(1000))
+
+
+class MaxPlayersPolicyTest(unittest.TestCase):
+
+    def test_full_lobby_starts_the_game(self):
+        policy = MaxPlayersPolicy(4, 10)
+        self.assertEqual(policy.time_left(3, 2), 8)
+        self.assertTrue(policy.is_full(4))
+        self.assertEqual(policy.time_left(4, 2), 0)
+
+
+class QuorumPolicyTest(unittest.TestCase):
+
+    def test_grace_starts_when_the_quorum_is_reached(self):
+        policy = QuorumPolicy(2, 3, window=10)
+        self.assertEqual(policy.time_left(1, 1), 9)
+        self.assertEqual(policy.time_left(2, 4), 3)
+        self.assertEqual(policy.time_left(3, 5), 2)
+
+    def test_quorum_is_kept_when_a_team_leaves(self):
+        policy = QuorumPolicy(2, 3, window=10)
+        policy.time_left(2, 4)
+        self.assertEqual(policy.time_left(1, 6), 1)
+
+    def test_window_ends_before_the_grace(self):
+        policy = QuorumPolicy(2, 5, window=10)
+        self.assertEqual(policy.time_left(2, 8), 2)
+
+    def test_full_lobby_starts_the_game(self):
+        policy = QuorumPolicy(2, 5, window=10, max_players=3)
+        self.assertEqual(policy.time_left(3, 1), 0)
+
+    def test_reset(self):
+        policy = QuorumPolicy(2, 3, window=10)
+        policy.time_left(2, 4)
+        policy.reset()
+        self.assertEqual(policy.time_left(1, 5), 5)
+
+    def test_copy_keeps_its_own_quorum(self):
+        policy = QuorumPolicy(2, 3, window=10)
+        copied = copy.copy(policy)
+        copied.time_left(2, 1)
+        self.assertIsNone(policy.quorum_reached)
+        self.assertEqual(copied.time_left(2, 2), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import socket
+import struct
+import unittest
+from Protocol import FrameReader, BinaryProtocol, TEXT_PROTOCOL, HEADER, MAGIC_COOKIE, REGISTER, KEYS, OFFER, \
+    MAX_CLIENT_PAYLOAD, pack_frame, pack_offer, unpack_offer, pack_register, pack_keys, pack_welcome, unpack_welcome, \
+    pack_results, unpack_results
+
+
+def received(data, segment):
+    """
+        send data over a socketpair in segments of the given size
+    :return: the chunks the receiving side read, as a stream would hand them over
+    :rtype: list
+    """
+
+    sender, receiver = socket.socketpair()
+    chunks = []
+    with sender, receiver:
+        for offset in range(0, len(data), segment):
+            sender.sendall(data[offset:offset + segment])
+            chunks.append(receiver.recv(segment))
+    return chunks
+
+
+class FrameReaderTest(unittest.TestCase):
+
+    def test_frames_split_across_segments(self):
+        stream = pack_keys(3) + pack_keys(0xffff) + pack_register("team")
+        reader = FrameReader(MAX_CLIENT_PAYLOAD)
+        frames = []
+        for chunk in received(stream, 1):
+            frames.extend(reader.feed(chunk))
+        self.assertEqual([message_type for message_type, payload in frames], [KEYS, KEYS, REGISTER])
+        self.assertEqual(len(reader.buffer), 0)
+
+    def test_size_reads_the_beginning_of_a_buffer(self):
+        buffer = bytearray(64)
+        frame = pack_keys(7)
+        buffer[:len(frame)] = frame
+        self.assertEqual(FrameReader().feed(buffer, len(frame)), [(KEYS, frame[HEADER.size:])])
+
+    def test_wrong_magic_cookie(self):
+        with self.assertRaises(ValueError):
+            FrameReader().feed(HEADER.pack(MAGIC_COOKIE ^ 1, KEYS, 2) + b'\0\1')
+
+    def test_frame_too_long(self):
+        with self.assertRaises(ValueError):
+            FrameReader(MAX_CLIENT_PAYLOAD).feed(HEADER.pack(MAGIC_COOKIE, KEYS, MAX_CLIENT_PAYLOAD + 1))
+
+    def test_welcome_round_trip(self):
+        (message_type, payload), = FrameReader().feed(pack_welcome([["a", "b"], ["c"], []]))
+        self.assertEqual(unpack_welcome(payload), [["a", "b"], ["c"], []])
+
+    def test_results_round_trip(self):
+        result = ([12, 7, 9], [["a", "b"], ["c"], ["d"]], 12, 3, ["a", "b"])
+        (message_type, payload), = FrameReader().feed(pack_results(*result))
+        self.assertEqual(unpack_results(payload), result)
+
+
+class CountKeysTest(unittest.TestCase):
+
+    def test_text_counts_bytes(self):
+        self.assertEqual(TEXT_PROTOCOL.count_keys(b"abc"), 3)
+        self.assertEqual(TEXT_PROTOCOL.count_keys(bytearray(100), 7), 7)
+
+    def test_binary_counts_key_frames(self):
+        protocol = BinaryProtocol()
+        stream = pack_keys(5) + pack_keys(60000)
+        self.assertEqual(sum(protocol.count_keys(chunk) for chunk in received(stream, 3)), 60005)
+
+    def test_binary_counts_the_beginning_of_a_buffer(self):
+        buffer = bytearray(64)
+        frame = pack_keys(9)
+        buffer[:len(frame)] = frame
+        self.assertEqual(BinaryProtocol().count_keys(memoryview(buffer), len(frame)), 9)
+
+
+    def test_short_key_frame(self):
+        with self.assertRaises(ValueError):
+            BinaryProtocol().count_keys(pack_frame(KEYS, b'\1'))
+
+    def test_long_key_frame(self):
+        with self.assertRaises(ValueError):
+            BinaryProtocol().count_keys(pack_frame(KEYS, b'\0\1\2'))
+
+
+class OfferTest(unittest.TestCase):
+
+    def test_offer_without_load_is_the_original_offer(self):
+        offer = pack_offer(2049)
+        self.assertEqual(struct.unpack("IbH", offer), (MAGIC_COOKIE, OFFER, 2049))
+        self.assertEqual(unpack_offer(offer), (MAGIC_COOKIE, OFFER, 2049, None, None))
+
+    def test_offer_with_load(self):
+        self.assertEqual(unpack_offer(pack_offer(40000, (None, 3))), (MAGIC_COOKIE, OFFER, 40000, 0, 3))
+        self.assertEqual(unpack_offer(pack_offer(2049, (8, 5))), (MAGIC_COOKIE, OFFER, 2049, 8, 5))
+
+    def test_short_offer(self):
+        with self.assertRaises(struct.error):
+            unpack_offer(b'\xef\xbe')
+
+
+if __name__ == '__main__':
+    unittest.main()
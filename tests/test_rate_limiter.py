@@ -0,0 +1,117 @@
+import unittest
+from RateLimiter import TokenBucket, KeyLimiter, unpack_limits
+from Server import Player
+
+START = 1000.0  # time the games start at
+
+
+def player(group=0):
+    return Player("team", None, None, group=group)
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_refill_is_capped_by_the_burst(self):
+        bucket = TokenBucket(10, 20, START)
+        self.assertEqual(bucket.take(25, START), 20)
+        self.assertEqual(bucket.take(25, START + 0.5), 5)
+        self.assertEqual(bucket.refill(START + 100), 20)
+
+    def test_time_going_back_doesnt_refill(self):
+        bucket = TokenBucket(10, 20, START)
+        bucket.take(20, START)
+        self.assertEqual(bucket.refill(START - 1), 0)
+
+
+class KeyLimiterTest(unittest.TestCase):
+
+    def test_no_limits_by_default(self):
+        limiter = KeyLimiter()
+        limiter.start(2, START)
+        team = player()
+        self.assertEqual(limiter.admit(team, 10 ** 6, START), 10 ** 6)
+        self.assertFalse(limiter.throttled(team, START))
+        self.assertEqual(limiter.discarded, 0)
+
+    def test_team_limit(self):
+        limiter = KeyLimiter(10, 20)
+        limiter.start(2, START)
+        team = player()
+        self.assertFalse(limiter.throttled(team, START))
+        self.assertEqual(limiter.admit(team, 15, START), 15)
+        self.assertEqual(limiter.admit(team, 15, START), 5)
+        self.assertTrue(limiter.throttled(team, START))
+        self.assertEqual(limiter.admit(team, 15, START + 1), 10)
+        self.assertEqual(limiter.discarded, 15)
+        self.assertEqual(team.discarded, 15)
+
+    def test_burst_defaults_to_seconds_of_the_rate(self):
+        limiter = KeyLimiter(10)
+        limiter.start(2, START)
+        self.assertEqual(limiter.admit(player(), 100, START), 20)
+
+    def test_teams_have_their_own_buckets(self):
+        limiter = KeyLimiter(10, 10)
+        limiter.start(2, START)
+        first, second = player(), player()
+        self.assertEqual(limiter.admit(first, 30, START), 10)
+        self.assertEqual(limiter.admit(second, 30, START), 10)
+
+    def test_flooding_team_is_flagged(self):
+        limiter = KeyLimiter(10, 10, abuse_factor=2)
+        limiter.start(2, START)
+        team = player()
+        limiter.admit(team, 29, START)
+        self.assertFalse(team.abusive)
+        limiter.admit(team, 1, START)
+        self.assertTrue(team.abusive)
+        self.assertEqual(limiter.abusive, [team])
+        limiter.admit(team, 100, START)
+        self.assertEqual(limiter.abusive, [team])
+
+    def test_group_limit(self):
+        limiter = KeyLimiter(group_rate=10, group_burst=10)
+        limiter.start(2, START)
+        first, second, other = player(0), player(0), player(1)
+        self.assertEqual(limiter.admit(first, 8, START), 8)
+        self.assertEqual(limiter.admit(second, 8, START), 2)
+        self.assertTrue(limiter.throttled(second, START))
+        self.assertEqual(limiter.admit(other, 8, START), 8)
+        self.assertFalse(second.abusive)
+
+    def test_team_keeps_the_tokens_discarded_by_the_group(self):
+        limiter = KeyLimiter(10, 10, group_rate=10, group_burst=10)
+        limiter.start(1, START)
+        first, second = player(), player()
+        self.assertEqual(limiter.admit(first, 10, START), 10)
+        self.assertEqual(limiter.admit(second, 5, START), 0)
+        self.assertEqual(second.bucket.tokens, 10)
+        self.assertEqual(second.discarded, 0)
+
+    def test_discard_of_a_throttled_team(self):
+        limiter = KeyLimiter(10, 10)
+        limiter.start(1, START)
+        team = player()
+        limiter.discard(team, 5, START)  # before it's first keys the team isn't over it's limit
+        self.assertEqual(team.discarded, 0)
+        limiter.admit(team, 10, START)
+        limiter.discard(team, 5, START)
+        self.assertEqual(team.discarded, 5)
+        self.assertEqual(limiter.discarded, 10)
+
+    def test_start_resets_the_game(self):
+        limiter = KeyLimiter(10, 10)
+        limiter.start(1, START)
+        limiter.admit(player(), 100, START)
+        limiter.start(1, START + 10)
+        self.assertEqual((limiter.discarded, limiter.abusive), (0, []))
+
+    def test_limits_round_trip(self):
+        limits = unpack_limits(KeyLimiter(12.5, 30, 100).pack())
+        self.assertEqual((limits.rate, limits.burst, limits.group_rate, limits.group_burst), (12.5, 30, 100, 200))
+        limits = unpack_limits(KeyLimiter().pack())
+        self.assertEqual((limits.rate, limits.group_rate), (None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
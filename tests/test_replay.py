@@ -0,0 +1,160 @@
+import os
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+from Server import Server, Arena
+from Protocol import BinaryProtocol, TEXT_PROTOCOL, pack_keys
+from RateLimiter import KeyLimiter
+from Replay import Recorder, read_events, MIN_RING_SIZE, ROUND, REGISTER, GAME, KEYS, RESULT, DRAINED
+from Simulator import Simulator
+
+
+def server(key_limiter=None):
+    """
+    :return: a server that isn't started, with the given key limiter
+    :rtype: Server
+    """
+
+    game_server = Server("test", interface='lo')
+    if key_limiter:
+        game_server.key_limiter = key_limiter
+    return game_server
+
+
+class RecordedGame:
+    """
+        a game played by an arena over socketpairs - the clients are the other ends of the pairs
+    """
+
+    def __init__(self, game_server, protocols):
+
+        self.arena = Arena(game_server, game_server.lobby_policy)
+        self.clients = []
+        for number, protocol in enumerate(protocols):
+            client, connection = socket.socketpair()
+            connection.settimeout(1)
+            self.arena.register_player("team{}".format(number), connection, ('127.0.0.1', number), protocol)
+            self.clients.append(client)
+
+    def send(self, number, data):
+        """
+            send data from a client and let the arena receive all of it
+        """
+
+        self.clients[number].sendall(data)
+        player = self.arena.players()[number]
+        while True:
+            player.connection.setblocking(False)
+            try:
+                if not player.connection.recv(1, socket.MSG_PEEK):
+                    break
+            except BlockingIOError:
+                break
+            self.arena.receive_keys(player)
+
+    def close(self):
+        for player, client in zip(self.arena.players(), self.clients):
+            player.connection.close()
+            client.close()
+
+
+class ReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "recording")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def play(self, ring_size=None, key_limiter=None):
+        """
+            record a game of two text teams and a binary one, and the bytes they sent in the lobby
+        :return: the sums the arena ended with, the keys it's limiter discarded and the recorded events
+        :rtype: tuple
+        """
+
+        game_server = server(key_limiter)
+        recorder = Recorder(self.path, ring_size)
+        game_server.use_recorder(recorder)
+        game = RecordedGame(game_server, [TEXT_PROTOCOL, BinaryProtocol(), TEXT_PROTOCOL])
+        try:
+            game.clients[0].sendall(b"early")  # typed in the lobby, never counted
+            game.arena.discard_lobby_bytes()
+            game.arena.start_game()
+            for i in range(20):
+                game.send(0, b"a" * (i + 1))
+                game.send(1, pack_keys(i) + pack_keys(3)[:4])
+                game.send(1, pack_keys(3)[4:])
+                game.send(2, b"bb")
+            sums = game.arena.result()[0]
+        finally:
+            game.close()
+            recorder.close()
+        return sums, game.arena.limiter.discarded, read_events(self.path)
+
+    def replay(self, events):
+        """
+        :return: the ReplayedRound of the single round in the events
+        """
+
+        rounds = Simulator(server()).replay(events)
+        self.assertEqual(len(rounds), 1)
+        return rounds[1]
+
+    def test_file_round_trip(self):
+        sums, discarded, events = self.play()
+        self.assertEqual(discarded, 0)
+        self.assertEqual([event[0] for event in events[:5]], [ROUND, REGISTER, REGISTER, REGISTER, DRAINED])
+        self.assertEqual(events[5][0], GAME)
+        self.assertEqual(events[-1][0], RESULT)
+        self.assertEqual(sums, [sum(range(1, 21)) + 40, sum(range(20)) + 60])
+
+        replayed = self.replay(events)
+        self.assertEqual(replayed.recorded_sums, sums)
+        self.assertEqual(replayed.replayed_sums, sums)
+        self.assertEqual(replayed.drained_events, 1)
+
+    def test_ring_round_trip(self):
+        sums, discarded, events = self.play(MIN_RING_SIZE)
+        replayed = self.replay(events)
+        self.assertEqual(replayed.recorded_sums, sums)
+        self.assertEqual(replayed.replayed_sums, sums)
+
+    def test_discarded_keys_replay(self):
+        sums, discarded, events = self.play(key_limiter=KeyLimiter(5, 10))
+        self.assertLess(sums[0], sum(range(1, 21)) + 40)
+        self.assertGreater(discarded, 0)
+        types = [event[0] for event in events]
+        self.assertIn(DRAINED, types[types.index(GAME):])  # the throttled text team was drained
+
+        replayed = self.replay(events)  # the limits are recorded with the round
+        self.assertEqual(replayed.replayed_sums, sums)
+        self.assertEqual(replayed.arena.limiter.discarded, discarded)
+
+    def test_ring_keeps_the_newest_events(self):
+        game_server = server()
+        recorder = Recorder(self.path, MIN_RING_SIZE)
+        game_server.use_recorder(recorder)
+        arena = Arena(game_server, game_server.lobby_policy)
+        arena.register_player("team", None, ('127.0.0.1', 0))
+        arena.start_game()
+        now = time.time()
+        for i in range(10000):  # far more than the ring holds
+            arena.ingest(arena.players()[0], str(i).encode(), now + i)
+        arena.result()
+        recorder.close()
+
+        events = read_events(self.path)
+        self.assertEqual(events[-1][0], RESULT)
+        keys = [int(event[4]) for event in events if event[0] == KEYS]
+        self.assertEqual(keys, list(range(10000 - len(keys), 10000)))
+        self.assertTrue(0 < len(keys) < 10000)
+        self.assertNotIn(ROUND, [event[0] for event in events])
+        self.assertEqual(Simulator(server()).replay(events), {})  # the beginning of the round was overwritten
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+import socket
+import unittest
+from Protocol import TEXT_PROTOCOL, BinaryProtocol, unpack_offer, pack_frame, pack_register, pack_keys, REGISTER
+from LobbyPolicy import MaxPlayersPolicy
+from RateLimiter import KeyLimiter
+from Server import Server, Arena, TeamNameReader, MAX_NAME_LENGTH, BUFFER_SIZE, DRAIN_SIZE
+
+
+def received(data, segment):
+    """
+        send data over a socketpair in segments of the given size
+    :return: the chunks the receiving side read, as a stream would hand them over
+    :rtype: list
+    """
+
+    sender, receiver = socket.socketpair()
+    chunks = []
+    with sender, receiver:
+        for offset in range(0, len(data), segment):
+            sender.sendall(data[offset:offset + segment])
+            chunks.append(receiver.recv(segment))
+    return chunks
+
+
+class TeamNameReaderTest(unittest.TestCase):
+
+    def feed(self, data, segment):
+        reader = TeamNameReader()
+        name = None
+        for chunk in received(data, segment):
+            name = reader.feed(chunk)
+        return name, reader
+
+    def test_name_split_across_segments(self):
+        name, reader = self.feed(b"the dirty cows\n", 3)
+        self.assertEqual(name, "the dirty cows")
+        self.assertIs(reader.protocol, TEXT_PROTOCOL)
+
+    def test_register_frame(self):
+        name, reader = self.feed(pack_register("cows"), 2)
+        self.assertEqual(name, "cows")
+        self.assertTrue(reader.protocol.binary)
+
+    def test_incomplete(self):
+        self.assertIsNone(self.feed(b"cow", 1)[0])
+        self.assertIsNone(self.feed(pack_register("cows")[:-1], 4)[0])
+
+    def test_name_too_long(self):
+        with self.assertRaises(ValueError):
+            self.feed(b"x" * (MAX_NAME_LENGTH + 1), 16)
+        with self.assertRaises(ValueError):
+            self.feed(b"x" * (MAX_NAME_LENGTH + 1) + b"\n", 100)
+
+    def test_invalid_utf8(self):
+        with self.assertRaises(ValueError):
+            self.feed(b"\xff\xfe\n", 3)
+
+    def test_size_reads_the_beginning_of_a_buffer(self):
+        buffer = bytearray(BUFFER_SIZE)
+        buffer[:5] = b"cows\n"
+        self.assertEqual(TeamNameReader().feed(buffer, 5), "cows")
+
+    def test_empty_register_frame(self):
+        with self.assertRaises(ValueError):
+            TeamNameReader().feed(pack_frame(REGISTER, b''))
+
+    def test_unknown_version(self):
+        with self.assertRaises(ValueError):
+            TeamNameReader().feed(pack_frame(REGISTER, b'\x09cows'))
+
+    def test_keys_before_the_name(self):
+        with self.assertRaises(ValueError):
+            TeamNameReader().feed(pack_keys(1))
+
+    def test_frames_after_the_register_frame(self):
+        with self.assertRaises(ValueError):
+            TeamNameReader().feed(pack_register("cows") + pack_keys(1))
+
+
+class LobbyBytesTest(unittest.TestCase):
+
+    def test_bytes_sent_before_the_welcome_arent_counted(self):
+        server = Server("test")
+        arena = Arena(server, server.lobby_policy)
+        client, connection = socket.socketpair()
+        with client, connection:
+            arena.register_player("team", connection, ('127.0.0.1', 0))
+            player = arena.players()[0]
+            client.sendall(b"x" * 50000)
+            arena.discard_lobby_bytes()
+            client.sendall(b"abc")
+            arena.receive_keys(player)
+            self.assertEqual(player.keys, 3)
+
+
+class QueueTest(unittest.TestCase):
+
+    def test_teams_that_left_the_queue_are_dropped(self):
+        server = Server("test")
+        pairs = [socket.socketpair() for i in range(3)]
+        for number, (client, connection) in enumerate(pairs):
+            connection.settimeout(1)
+            server.join_lobby("team{}".format(number), TEXT_PROTOCOL, connection, ('127.0.0.1', number), 0)
+        self.assertEqual(len(server.queued), 3)  # no arena is open
+
+        pairs[0][0].close()
+        pairs[2][0].sendall(b"typed while queued")
+        server.arena = Arena(server, server.lobby_policy)
+        server.join_queued()
+        self.assertEqual([player.name for player in server.arena.players()], ["team1", "team2"])
+        self.assertEqual(pairs[0][1].fileno(), -1)
+        self.assertEqual(pairs[1][1].gettimeout(), 1)
+        self.assertEqual(server.queued, [])
+        for client, connection in pairs:
+            client.close()
+            connection.close()
+
+
+class ReceiveKeysTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = Server("test")
+        self.arena = Arena(self.server, self.server.lobby_policy)
+        self.client, self.connection = socket.socketpair()
+
+    def tearDown(self):
+        self.client.close()
+        self.connection.close()
+
+    def player(self, protocol=TEXT_PROTOCOL):
+        self.arena.register_player("team", self.connection, ('127.0.0.1', 0), protocol)
+        self.arena.start_game()
+        return self.arena.players()[0]
+
+    def test_text_keys_are_read_into_the_arena_buffer(self):
+        player = self.player()
+        buffer = self.arena.receive_buffer
+        self.client.sendall(b"k" * (BUFFER_SIZE + 10))
+        self.assertTrue(self.arena.receive_keys(player))
+        self.assertEqual(player.keys, BUFFER_SIZE)
+        self.assertTrue(self.arena.receive_keys(player))
+        self.assertEqual(player.keys, BUFFER_SIZE + 10)
+        self.assertIs(self.arena.receive_buffer, buffer)
+        self.assertEqual((self.arena.recv_calls, self.arena.received_bytes), (2, BUFFER_SIZE + 10))
+
+    def test_binary_frames_split_across_reads(self):
+        player = self.player(BinaryProtocol())
+        frames = pack_keys(7) + pack_keys(5)
+        self.client.sendall(frames[:13])
+        self.arena.receive_keys(player)
+        self.assertEqual(player.keys, 7)
+        self.client.sendall(frames[13:])
+        self.arena.receive_keys(player)
+        self.assertEqual(player.keys, 12)
+
+    def test_throttled_text_client_is_drained_in_big_reads(self):
+        self.server.key_limiter = KeyLimiter(5, 10)
+        self.arena = Arena(self.server, self.server.lobby_policy)
+        player = self.player()
+        self.client.sendall(b"k" * 20)
+        self.arena.receive_keys(player)
+        self.assertEqual(player.keys, 10)
+        self.client.sendall(b"k" * DRAIN_SIZE)
+        self.arena.receive_keys(player)
+        self.assertEqual(player.keys, 10)
+        self.assertEqual(self.arena.drained_bytes, DRAIN_SIZE)
+
+    def test_closed_connection(self):
+        player = self.player()
+        self.client.close()
+        self.assertFalse(self.arena.receive_keys(player))
+
+
+class OfferMessageTest(unittest.TestCase):
+
+    def test_load_is_sent_only_when_asked(self):
+        server = Server("test", MaxPlayersPolicy(4))
+        arena = Arena(server, server.lobby_policy)
+        arena.register_player("team", None, ('127.0.0.1', 0))
+        self.assertEqual(len(server.offer_message(arena)), 8)
+        server.announce_load = True
+        self.assertEqual(unpack_offer(server.offer_message(arena))[3:], (4, 1))
+        self.assertEqual(len(server.offer_message()), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()